@@ -8,6 +8,8 @@ setuptools.setup(
     entry_points = {
         'console_scripts':[
             'vision6D = vision6D.entry.main:main',
+            'vision6D-convert = vision6D.entry.convert:main',
+            'vision6D-pnp = vision6D.entry.pnp:main',
         ]
     },
     url='https://github.com/ykzzyk/vision6D',
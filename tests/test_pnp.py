@@ -0,0 +1,52 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: test_pnp.py
+@time: 2026-10-17 12:00
+@desc: warm started PnP of mirrored meshes
+'''
+
+import pytest
+import numpy as np
+import trimesh
+
+from vision6D.tools import utils
+
+CAMERA_INTRINSICS = np.array([[19172.02089833029, 0, 954.4324739015676], [0, 19172.02089833029, 538.2131876789998], [0, 0, 1]])
+FLIPS = {'x': np.diag([-1, 1, 1, 1]), 'y': np.diag([1, -1, 1, 1])}
+
+def project(pose, pts3d):
+    # the vtk world to opencv coordinate change of solve_epnp_cv2
+    camera_points = utils.transform_vertices(pts3d, np.diag([-1, -1, 1, 1]) @ pose)
+    projected = camera_points @ CAMERA_INTRINSICS.T
+    return projected[:, :2] / projected[:, 2:]
+
+def make_pose(angle, axis, translation):
+    pose = trimesh.transformations.rotation_matrix(angle, axis)
+    pose[:3, 3] = translation
+    return pose
+
+@pytest.mark.parametrize("mirror_x, mirror_y", [(True, False), (False, True), (True, True)])
+@pytest.mark.parametrize("conjugate", [True, False])
+def test_mirrored_warm_start_is_kept(mirror_x, mirror_y, conjugate):
+    flip = np.eye(4)
+    if mirror_x: flip = FLIPS['x'] @ flip
+    if mirror_y: flip = FLIPS['y'] @ flip
+    gt_pose = make_pose(0.7, [1, 2, 0.5], [0.002, 0.001, 1.0])
+    # the actor matrices of a mirrored mesh, the previous frame slightly off the current one
+    actor_matrix = flip @ gt_pose
+    previous_actor_matrix = flip @ make_pose(0.71, [1, 2.02, 0.5], [0.0021, 0.001, 1.0])
+
+    # the nocs prediction is conjugated back (flip @ pose @ flip), the latlon one is compared as is
+    solver_pose = flip @ gt_pose @ flip if conjugate else gt_pose
+    pts3d = np.random.default_rng(0).uniform(-0.02, 0.02, (500, 3))
+    pts2d = project(solver_pose, pts3d)
+
+    initial_pose = utils.mirror_initial_pose(previous_actor_matrix, mirror_x, mirror_y, conjugate)
+    predicted_pose, warm_start = utils.solve_pnp_warm_start(pts2d, pts3d, CAMERA_INTRINSICS, initial_pose)
+    assert warm_start
+    if conjugate: predicted_pose = flip @ predicted_pose @ flip
+    assert utils.angler_distance(predicted_pose[:3, :3], (flip @ actor_matrix)[:3, :3]) < 1e-3
+    assert np.allclose(predicted_pose[:3, 3], (flip @ actor_matrix)[:3, 3], atol=1e-6)
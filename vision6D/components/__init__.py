@@ -1,4 +1,5 @@
 from .singleton import Singleton
+from .render_store import RenderStore
 from .image_store import ImageStore
 from .mask_store import MaskStore
 from .bbox_store import BboxStore
@@ -8,6 +9,7 @@ from .folder_store import FolderStore
 
 __all__ = [
     'Singleton',
+    'RenderStore',
     'ImageStore',
     'MaskStore',
     'BboxStore',
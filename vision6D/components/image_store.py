@@ -15,8 +15,8 @@ import pyvista as pv
 import PIL.Image
 
 from . import Singleton
+from .render_store import RenderStore
 from ..tools import utils
-from ..path import PLOT_SIZE
 
 class ImageStore(metaclass=Singleton):
     def __init__(self, plotter):
@@ -24,6 +24,7 @@ class ImageStore(metaclass=Singleton):
         self.camera = pv.Camera() # camera related parameters, do not reset the camera!
         self.mirror_x = False
         self.mirror_y = False
+        self.render_store = RenderStore()
         self.reset()
         
     def reset(self):
@@ -66,8 +67,8 @@ class ImageStore(metaclass=Singleton):
             [0, 0, 1]
         ])
         
-        # Setting the view angle in degrees, PLOT_SIZE[1] is the height of the image
-        view_angle = (180 / math.pi) * (2.0 * math.atan2(PLOT_SIZE[1]/2.0, self.fy)) # or view_angle = np.degrees(2.0 * math.atan2(height/2.0, f)) # focal_length = (height / 2.0) / math.tan(math.radians(self.plotter.camera.view_angle / 2))
+        # Setting the view angle in degrees, render_size[1] is the height of the image
+        view_angle = (180 / math.pi) * (2.0 * math.atan2(self.render_store.render_size[1]/2.0, self.fy)) # or view_angle = np.degrees(2.0 * math.atan2(height/2.0, f)) # focal_length = (height / 2.0) / math.tan(math.radians(self.plotter.camera.view_angle / 2))
         self.camera.SetViewAngle(view_angle) # view angle should be in degrees
 
     def set_camera_props(self):
@@ -77,10 +78,8 @@ class ImageStore(metaclass=Singleton):
 
     #^ Set the plot size and update the camera intrinsics
     def set_plot_size(self, width, height):
-        global PLOT_SIZE  # Declare that we are referring to the global variable
-        PLOT_SIZE = (width, height)  # This will update the global variable
-        # self.cx = PLOT_SIZE[0] // 2
-        # self.cy = PLOT_SIZE[1] // 2
+        # the full resolution render target shared with the mask and mesh stores
+        self.render_store.render_size = (width, height)
         self.set_camera_intrinsics()
     
     #^ Image related
@@ -122,8 +121,6 @@ class ImageStore(metaclass=Singleton):
         if self.mirror_x: image_source = image_source[::-1, :, :]
         if self.mirror_y: image_source = image_source[:, ::-1, :]
 
-        self.render = utils.create_render(self.width, self.height)
-        
         # create the image pyvista object
         self.image_pv = pv.ImageData(dimensions=(self.width, self.height, 1), spacing=[1e-4, 1e-4, 1], origin=(0.0, 0.0, 0.0))
         self.image_pv.point_data["values"] = image_source.reshape((self.width * self.height, channel)) # order = 'C
@@ -132,13 +129,23 @@ class ImageStore(metaclass=Singleton):
         
         return self.image_pv, image_source, channel
         
-    def render_image(self, camera):
-        self.render.clear()
-        render_actor = self.image_actor.copy(deep=True)
-        render_actor.GetProperty().opacity = 1
-        self.render.add_actor(render_actor, pickable=False)
-        self.render.camera = camera
-        self.render.disable()
-        self.render.show(auto_close=False)
-        image = self.render.last_image
-        return image
\ No newline at end of file
+    def render_image(self, camera, size=None):
+        return self.render_store.render_actors({'image': self.image_actor}, camera, (self.width, self.height) if size is None else size)
+
+    def is_canonical_view(self, camera):
+        """True if camera is the view set by reset_camera, where the image fills the render pixel for pixel"""
+        return (np.allclose(camera.position, self.camera.position) and np.allclose(camera.focal_point, self.camera.focal_point)
+                and np.allclose(camera.up, self.camera.up) and np.isclose(camera.view_angle, self.camera.view_angle)
+                and camera.parallel_projection == self.camera.parallel_projection)
+
+    def get_image(self, camera):
+        """The image as seen by camera, the frame in memory (with the mirror flips as views) in the canonical view"""
+        if not self.is_canonical_view(camera): return self.render_image(camera)
+        # image_source is stored flipped on both axes for the plotter, see add_image
+        image = self.image_source[::-1, ::-1]
+        if self.mirror_x: image = image[::-1, :]
+        if self.mirror_y: image = image[:, ::-1]
+        # the (h, w, 3) uint8 rgb of render_image whatever the source is: grayscale is repeated and alpha dropped
+        if image.ndim == 2: image = image[..., None]
+        if image.shape[-1] == 1: image = np.repeat(image, 3, axis=-1)
+        return image[..., :3].astype(np.uint8, copy=False)
\ No newline at end of file
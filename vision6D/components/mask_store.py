@@ -9,6 +9,7 @@
 '''
 
 import pathlib
+import functools
 
 import cv2
 import PIL.Image
@@ -56,7 +57,7 @@ class MaskStore(metaclass=Singleton):
         
         # Mirror points
         mask_center = np.array([w // 2, h // 2, 0]) * 1e-4
-        self.render = utils.create_render(w, h)
+        self.render_size = (w, h)
         
         # Consider the mirror effect
         if self.mirror_x: points[:, 0] = w*1e-4 - points[:, 0]
@@ -76,13 +77,26 @@ class MaskStore(metaclass=Singleton):
         mask_surface = pv.PolyData(tranformed_points, cells).triangulate()
         return mask_surface
 
-    def render_mask(self, camera):
-        self.render.clear()
-        render_actor = self.mask_actor.copy(deep=True)
-        render_actor.GetProperty().opacity = 1
-        self.render.add_actor(render_actor, pickable=False)
-        self.render.camera = camera
-        self.render.disable()
-        self.render.show(auto_close=False)
-        image = self.render.last_image
-        return image
\ No newline at end of file
+    def render_mask(self, camera, size=None):
+        """Projects the mask polygon with camera and fills it on the CPU, the pixels of an off-screen render without OpenGL"""
+        return self.snapshot_mask(camera, size)()
+
+    def snapshot_mask(self, camera, size=None):
+        """Returns a function rendering the mask as it is now, it does not touch the actor so it can run on any thread"""
+        points = utils.get_mask_actor_points(self.mask_actor)
+        return functools.partial(self.fill_mask, points, camera.copy(), self.get_mask_color(points, camera), self.render_size if size is None else size)
+
+    def fill_mask(self, points, camera, color, size):
+        w, h = size
+        mask = utils.fill_polygon_mask(utils.project_points(points, camera, w, h), w, h)
+        return mask[..., None] * color
+
+    def get_mask_color(self, points, camera):
+        # the color the headlight gives the flat polygon in a render
+        prop = self.mask_actor.GetProperty()
+        color = np.array(prop.GetColor())
+        if prop.GetLighting():
+            normal = np.cross(points, np.roll(points, -1, axis=0)).sum(axis=0)
+            normal /= max(np.linalg.norm(normal), 1e-30)
+            color *= min(prop.GetAmbient() + prop.GetDiffuse() * abs(normal @ np.array(camera.GetDirectionOfProjection())), 1)
+        return np.round(color * 255).astype(np.uint8)
\ No newline at end of file
@@ -8,121 +8,327 @@
 @desc: create store for mesh related base functions
 '''
 
+import os
+import json
 import pathlib
-from typing import Optional, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 from dataclasses import dataclass, field
 
+import vtk
 import trimesh
 import pyvista as pv
 import numpy as np
 
 from . import Singleton
+from .render_store import RenderStore
 from ..tools import utils
-from ..path import PLOT_SIZE
+from ..tools import mesh_cache
+from ..tools import rasterizer
+
+# fraction of the triangles kept by each level-of-detail proxy, from fine to coarse
+LOD_LEVELS = (0.1, 0.01)
+# meshes with fewer triangles are rendered at full resolution all the time
+LOD_MIN_FACES = 100_000
+# the finest proxy under this many triangles is shown while the user drags
+LOD_MAX_FACES = 100_000
 
 @dataclass
 class MeshData:
     mesh_path: str
     name: str
-    source_mesh: trimesh.Trimesh
     pv_mesh: pv.PolyData
     actor: pv.Actor
     opacity_spinbox: Optional[str]
     color_button: Optional[str]
-    color: str
-    spacing: List[float] = field(default_factory=[1, 1, 1])
+    color: Optional[str]
+    spacing: List[float] = field(default_factory=lambda: [1, 1, 1])
+    # the spacing is a transform on the actor, model = pv_mesh.points * spacing + spacing_offset
+    spacing_offset: np.ndarray = field(default_factory=lambda: np.zeros(3))
     mirror_x: bool = False
     mirror_y: bool = False
     opacity: float = 1.0
     previous_opacity: float = 1.0
-    initial_pose: np.ndarray = np.eye(4)
+    initial_pose: np.ndarray = field(default_factory=lambda: np.eye(4))
     undo_poses: List[np.ndarray] = field(default_factory=list)
     undo_vertices: List[np.ndarray] = field(default_factory=list)
+    nocs_colors: Optional[np.ndarray] = None
+    # bumped on every change of the vertices, nocs_colors are valid while nocs_version matches it
+    geometry_version: int = 0
+    nocs_version: int = 0
+    centroid: Optional[np.ndarray] = None
+    centroid_version: int = 0
+    metadata: Dict = field(default_factory=dict)
+    # (point ids into pv_mesh, decimated proxy) per level in LOD_LEVELS
+    lod_meshes: List[Tuple[np.ndarray, pv.PolyData]] = field(default_factory=list)
+
+    @property
+    def source_mesh(self) -> trimesh.Trimesh:
+        # the mesh model the pose (user_matrix) applies to, the faces are a view on the pv_mesh buffer
+        vertices, faces = utils.get_polydata_vertices_faces(self.pv_mesh)
+        vertices = vertices * self.spacing + self.spacing_offset
+        source_mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        source_mesh.metadata.update(self.metadata)
+        return source_mesh
 
 class MeshStore(metaclass=Singleton):
     def __init__(self):
         self.reference: Optional[str] = None
-        self.render = utils.create_render(PLOT_SIZE[0], PLOT_SIZE[1])
+        self.render_store = RenderStore()
         self.meshes: Dict[str, MeshData] = {}
         self.color_counter = 0
         self.color_button = None
         self.colors = ["wheat", "cyan", "magenta", "yellow", "lime", "dodgerblue", "white", "black"]
         self.latlon = utils.load_latitude_longitude()
         self.toggle_anchor_mesh = True
+        # mappers of the meshes currently rendered through their proxies
+        self.full_resolution_mappers = {}
 
     def reset(self): 
         self.mesh_path = None
         self.color_counter = 0
         self.toggle_anchor_mesh = True
         self.meshes.clear()
+        self.full_resolution_mappers.clear()
 
     #^ Mesh related
-    def add_mesh(self, mesh_source) -> Optional[MeshData]:
-
+    def load_mesh(self, mesh_source) -> Optional[MeshData]:
+        """Parses mesh_source into a MeshData without touching the store, safe to call from worker threads"""
         source_mesh = None
+        cached_mesh = None
 
         if isinstance(mesh_source, pathlib.Path) or isinstance(mesh_source, str):
             mesh_path = str(mesh_source)
-            if pathlib.Path(mesh_path).suffix == '.mesh': mesh_source = utils.load_trimesh(mesh_source)
+            # a cache hit is already the final trimesh, no format parsing needed
+            cached_mesh = mesh_cache.load_mesh(mesh_path)
+            if cached_mesh is not None: mesh_source = cached_mesh
+            elif pathlib.Path(mesh_path).suffix == '.mesh': mesh_source = utils.load_trimesh(mesh_source)
             else: mesh_source = pv.read(mesh_path)
 
         if isinstance(mesh_source, trimesh.Trimesh):
             source_mesh = mesh_source
-            source_mesh.vertices = source_mesh.vertices.reshape(-1, 3)
-            source_mesh.faces = source_mesh.faces.reshape(-1, 3)
-            pv_mesh = pv.wrap(mesh_source)
 
         if isinstance(mesh_source, pv.PolyData):
             source_mesh = trimesh.Trimesh(mesh_source.points, mesh_source.faces.reshape((-1, 4))[:, 1:], process=False)
-            source_mesh.vertices = source_mesh.vertices.reshape(-1, 3)
-            source_mesh.faces = source_mesh.faces.reshape(-1, 3)
-            pv_mesh = pv.wrap(source_mesh)
         
         if source_mesh is not None:
+            if cached_mesh is None: mesh_cache.save_mesh(mesh_path, source_mesh)
+            # the VTK arrays are built on top of the trimesh buffers, after this the trimesh itself is not kept
+            pv_mesh = utils.create_pv_mesh(source_mesh.vertices, source_mesh.faces)
             mesh_data = MeshData(mesh_path=mesh_path,
                                 name=pathlib.Path(mesh_path).stem + "_mesh", 
-                                source_mesh=source_mesh, 
                                 pv_mesh=pv_mesh,
                                 color_button=None,
                                 actor=None,
-                                color=self.colors[self.color_counter],
+                                color=None,
                                 opacity_spinbox=None,
-                                spacing=[1e-3, 1e-3, 1e-3])
+                                spacing=[1e-3, 1e-3, 1e-3],
+                                nocs_colors=source_mesh.metadata.get('nocs'),
+                                centroid=source_mesh.metadata.get('centroid'),
+                                metadata=source_mesh.metadata)
             
-            # set spacing for the mesh
-            mesh_data.pv_mesh.points *= mesh_data.spacing
-
-            self.meshes[mesh_data.name] = mesh_data
-
-            # assign a color to every mesh
-            self.color_counter += 1
-            self.color_counter %= len(self.colors)
+            # the spacing is applied by the actor, see apply_spacing
+            self.build_lod_meshes(mesh_data)
 
             return mesh_data
 
         return None
 
+    def register_mesh(self, mesh_data):
+        self.meshes[mesh_data.name] = mesh_data
+
+        # assign a color to every mesh
+        mesh_data.color = self.colors[self.color_counter]
+        self.color_counter += 1
+        self.color_counter %= len(self.colors)
+
+    def add_mesh(self, mesh_source) -> Optional[MeshData]:
+        mesh_data = self.load_mesh(mesh_source)
+        if mesh_data: self.register_mesh(mesh_data)
+        return mesh_data
+
+    def load_meshes(self, mesh_sources):
+        """Parses mesh_sources on a thread pool, yields (mesh_source, MeshData or None) in submission order
+
+        The parsing (memory maps, numpy, the VTK readers and filters) mostly runs without the GIL, so
+        the whole batch takes about as long as its largest mesh. Registering the meshes is left to
+        the caller, which has to do it on the Qt thread. Blank paths are skipped.
+        """
+        mesh_sources = [mesh_source for mesh_source in mesh_sources if mesh_source is not None and not (isinstance(mesh_source, str) and not mesh_source)]
+        if not mesh_sources: return
+        with ThreadPoolExecutor(max_workers=min(len(mesh_sources), os.cpu_count() or 1)) as executor:
+            futures = [executor.submit(self.load_mesh, mesh_source) for mesh_source in mesh_sources]
+            for mesh_source, future in zip(mesh_sources, futures): yield mesh_source, future.result()
+
+    def build_lod_meshes(self, mesh_data):
+        mesh_data.lod_meshes.clear()
+        if mesh_data.pv_mesh.n_cells < LOD_MIN_FACES: return
+        # vtkDecimatePro only deletes vertices, every proxy vertex is one of the mesh vertices and the
+        # ids let the proxies follow later edits of the points (anchoring, undo) with a gather
+        mesh = utils.create_pv_mesh(*utils.get_polydata_vertices_faces(mesh_data.pv_mesh))
+        mesh.point_data['point_ids'] = np.arange(mesh.n_points)
+        fraction = 1
+        for level in LOD_LEVELS:
+            mesh = mesh.decimate_pro(1 - level / fraction)
+            fraction = level
+            point_ids = mesh.point_data['point_ids'].copy()
+            _, faces = utils.get_polydata_vertices_faces(mesh)
+            lod_mesh = utils.create_pv_mesh(mesh_data.pv_mesh.points[point_ids], faces.copy())
+            mesh_data.lod_meshes.append((point_ids, lod_mesh))
+
+    def get_lod_mesh(self, mesh_data, mesh):
+        """Returns the proxy of mesh_data refreshed from mesh, the full resolution data the mapper renders"""
+        for point_ids, lod_mesh in mesh_data.lod_meshes:
+            if lod_mesh.n_cells <= LOD_MAX_FACES: break
+        # the topology never changes, a gather of the points and point data is enough
+        np.take(mesh.points, point_ids, axis=0, out=lod_mesh.points)
+        lod_mesh.GetPoints().Modified()
+        for name, array in mesh.point_data.items(): lod_mesh.point_data[name] = array[point_ids]
+        lod_mesh.point_data.active_scalars_name = mesh.point_data.active_scalars_name
+        return lod_mesh
+
+    def use_lod_meshes(self, enable):
+        # only the mapper changes, the actors and their user matrices are left alone
+        swapped = False
+        for name, mesh_data in self.meshes.items():
+            if not mesh_data.lod_meshes or mesh_data.actor is None: continue
+            if enable and name not in self.full_resolution_mappers:
+                # pyvista may feed the mapper through a pipeline (e.g. to activate the scalars), the mapper is kept
+                # as it is and the proxy is rendered by a copy of it, with the data of the pipeline output
+                mapper = mesh_data.actor.GetMapper()
+                mapper.GetInputAlgorithm().Update()
+                lod_mapper = vtk.vtkDataSetMapper()
+                lod_mapper.ShallowCopy(mapper)
+                lod_mapper.SetInputData(self.get_lod_mesh(mesh_data, pv.wrap(mapper.GetInput())))
+                self.full_resolution_mappers[name] = mapper
+                mesh_data.actor.SetMapper(lod_mapper)
+                swapped = True
+            elif not enable and name in self.full_resolution_mappers:
+                mesh_data.actor.SetMapper(self.full_resolution_mappers.pop(name))
+                swapped = True
+        return swapped
+
+    def get_nocs_colors(self, mesh_data):
+        if mesh_data.nocs_colors is None or mesh_data.nocs_version != mesh_data.geometry_version:
+            mesh_data.nocs_colors = utils.color_mesh_nocs(mesh_data.pv_mesh.points)
+            mesh_data.nocs_version = mesh_data.geometry_version
+        return mesh_data.nocs_colors
+
+    def update_vertices(self, mesh_data, vertices=None, transformation_matrix=None):
+        """Records a change of the mesh vertices, either new vertices or points already modified in place
+
+        transformation_matrix maps the previous vertices to the new ones, if it is known the cached nocs
+        colors are updated instead of being recomputed.
+        """
+        if vertices is not None: mesh_data.pv_mesh.points = vertices
+        else: mesh_data.pv_mesh.GetPoints().Modified()
+        nocs_valid = mesh_data.nocs_colors is not None and mesh_data.nocs_version == mesh_data.geometry_version
+        mesh_data.geometry_version += 1
+        if nocs_valid and transformation_matrix is not None and utils.update_nocs_colors(mesh_data.nocs_colors, transformation_matrix):
+            mesh_data.nocs_version = mesh_data.geometry_version
+        # the displayed nocs colors follow the vertices, hidden ones are dropped and recomputed when shown again
+        if 'nocs' in mesh_data.pv_mesh.point_data:
+            if mesh_data.color == 'nocs': mesh_data.pv_mesh.point_data['nocs'] = self.get_nocs_colors(mesh_data)
+            else: mesh_data.pv_mesh.point_data.remove('nocs')
+
+    def get_centroid(self, mesh_data):
+        if mesh_data.centroid is None or mesh_data.centroid_version != mesh_data.geometry_version:
+            mesh_data.centroid = np.mean(mesh_data.pv_mesh.points, axis=0)
+            mesh_data.centroid_version = mesh_data.geometry_version
+        return mesh_data.centroid
+
+    def get_spacing_matrix(self, mesh_data):
+        # maps the pv_mesh points to the mesh model, which user_matrix is applied to
+        matrix = np.diag(np.append(mesh_data.spacing, 1.0))
+        matrix[:3, 3] = mesh_data.spacing_offset
+        return matrix
+
+    def apply_spacing(self, mesh_data):
+        # the actor matrix is user_matrix @ T(position) @ S(scale) when the origin is 0
+        mesh_data.actor.SetOrigin(0, 0, 0)
+        mesh_data.actor.SetScale(*mesh_data.spacing)
+        mesh_data.actor.SetPosition(*mesh_data.spacing_offset)
+
+    def set_spacing(self, mesh_data, spacing):
+        # scale about the centroid of the model, so it stays in place
+        centroid = self.get_centroid(mesh_data)
+        mesh_data.spacing_offset = mesh_data.spacing_offset + (np.array(mesh_data.spacing) - np.array(spacing)) * centroid
+        mesh_data.spacing = spacing
+        if mesh_data.actor is not None: self.apply_spacing(mesh_data)
+
+    def get_source_vertices(self, mesh_data):
+        # the mesh model in the units of the source file, i.e. without the spacing
+        return mesh_data.pv_mesh.points + mesh_data.spacing_offset / np.array(mesh_data.spacing)
+
+    def write_model_state(self, mesh_data, output_path):
+        # the spacing and the mirroring a saved pose applies to, read back by vision6D-pnp
+        state = {'spacing': np.asarray(mesh_data.spacing, dtype=float).tolist(), 'spacing_offset': np.asarray(mesh_data.spacing_offset, dtype=float).tolist(),
+                 'mirror_x': bool(mesh_data.mirror_x), 'mirror_y': bool(mesh_data.mirror_y)}
+        with open(output_path, 'w') as f: json.dump(state, f, indent=4)
+
+    def write_mesh(self, mesh_data, output_dir, suffix=''):
+        vertices = self.get_source_vertices(mesh_data)
+        _, faces = utils.get_polydata_vertices_faces(mesh_data.pv_mesh)
+        header = utils.meshobj_header(mesh_data.metadata)
+        output_path = pathlib.Path(output_dir) / (pathlib.Path(mesh_data.mesh_path).stem + ".mesh")
+        return utils.writemesh(output_path, vertices, faces, header, suffix=suffix)
+
+    def export_meshes(self, output_dir):
+        # meshes whose files get the same name (e.g. "x_centered" and "x") are numbered, the parallel writes never share a file
+        jobs, names = [], set()
+        for mesh_data in self.meshes.values():
+            stem, suffix, count = pathlib.Path(mesh_data.mesh_path).stem, '', 1
+            while utils.mesh_file_name(stem, suffix) in names: suffix, count = f"_{count}", count + 1
+            names.add(utils.mesh_file_name(stem, suffix))
+            jobs.append((mesh_data, suffix))
+        # every mesh is written with a single call, numpy and the file writes release the GIL so threads are enough
+        with ThreadPoolExecutor() as executor:
+            output_paths = list(executor.map(lambda job: self.write_mesh(job[0], output_dir, job[1]), jobs))
+        return output_paths
+
     def remove_mesh(self, name):
         del self.meshes[name]
+        self.render_store.remove_actor(name)
+        self.full_resolution_mappers.pop(name, None)
         self.reference = None
 
-    def render_mesh(self, camera):
-        self.render.clear()
+    def render_key(self, names, camera, size):
+        """What a render of the named meshes depends on: geometry, pose, color mode, camera and resolution"""
+        meshes = []
+        for name in names:
+            mesh_data = self.meshes[name]
+            mapper, prop = mesh_data.actor.GetMapper(), mesh_data.actor.GetProperty()
+            # the modified times catch the color arrays and display settings changed in place
+            meshes.append((name, mesh_data.geometry_version, mesh_data.color, mapper.GetInput().GetMTime(), mapper.GetMTime(), prop.GetMTime(),
+                           pv.array_from_vtkmatrix(mesh_data.actor.GetMatrix()).tobytes()))
+        return (tuple(meshes), utils.camera_key(camera), tuple(size))
+
+    def render_mesh(self, camera, size=None):
+        """Renders the reference mesh at size (width, height), the full image size by default"""
         mesh_data = self.meshes[self.reference]
-        vertices, faces = utils.get_mesh_actor_vertices_faces(mesh_data.actor)
-        pv_mesh = pv.wrap(trimesh.Trimesh(vertices, faces, process=False))
-        colors = utils.get_mesh_actor_scalars(mesh_data.actor)
-        if colors is not None: mesh = self.render.add_mesh(pv_mesh, scalars=colors, rgb=True, style='surface', opacity=1, name=self.reference)
-        else: mesh = self.render.add_mesh(pv_mesh, color=mesh_data.color, style='surface', opacity=1, name=self.reference)
-        mesh.user_matrix = mesh_data.actor.user_matrix
-        # set the light source to add the textures
-        light = pv.Light(light_type='headlight')
-        self.render.add_light(light)
-        self.render.camera = camera
-        self.render.disable()
-        self.render.show(auto_close=False)
-        image = self.render.last_image
-        return image
+        size = self.render_store.render_size if size is None else size
+        return self.render_store.cached(('color',) + self.render_key([self.reference], camera, size),
+                                        lambda: self.render_store.render_actors({self.reference: mesh_data.actor}, camera, size))
+
+    def snapshot_mesh(self, camera, size=None):
+        """Returns a function rendering the reference mesh as it is now with the numpy rasterizer, it can run on any thread"""
+        mesh_data = self.meshes[self.reference]
+        snapshot = rasterizer.snapshot_actors({self.reference: mesh_data.actor}, camera, self.render_store.render_size if size is None else size)
+        return lambda: snapshot().color
+
+    def render_mesh_poses(self, poses, camera, name=None, mask=False, size=None):
+        """Renders the reference mesh (or the named mesh) once per pose of poses (N, 4, 4), the user_matrix the actor would have"""
+        mesh_data = self.meshes[self.reference if name is None else name]
+        matrices = np.asarray(poses).reshape((-1, 4, 4)) @ self.get_spacing_matrix(mesh_data)
+        return self.render_store.render_poses(mesh_data.name, mesh_data.actor, matrices, camera, self.render_store.render_size if size is None else size, mask)
+
+    def render_mesh_buffers(self, camera, mask_actor=None, names=None, size=None):
+        """Color, depth, instance id and mask buffers of the reference mesh (or the named meshes) from a single render"""
+        names = [self.reference] if names is None else names
+        size = self.render_store.render_size if size is None else size
+        mask_key = None if mask_actor is None else utils.get_mask_actor_points(mask_actor).tobytes()
+        return self.render_store.cached(('buffers', mask_key) + self.render_key(names, camera, size),
+                                        lambda: self.render_store.render_buffers({name: self.meshes[name].actor for name in names}, camera, size, mask_actor))
     
     def get_poses_from_undo(self, mesh_data):
         transformation_matrix = mesh_data.undo_poses.pop()
@@ -137,7 +343,7 @@ class MeshStore(metaclass=Singleton):
         verts = mesh_data.undo_vertices.pop()  # initialize verts with current vertices
         while mesh_data.undo_vertices and (verts == vertices).all(): 
             verts = mesh_data.undo_vertices.pop()
-        mesh_data.pv_mesh.points = verts
+        self.update_vertices(mesh_data, verts)
         mesh_data.actor.user_matrix = np.eye(4)
             
     def undo_actor_pose(self, name):
@@ -0,0 +1,233 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: render_store.py
+@time: 2026-10-17 16:40
+@desc: create store for the off-screen render contexts shared by the image, mask and mesh stores
+'''
+
+import math
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import vtk
+import numpy as np
+import pyvista as pv
+from easydict import EasyDict
+import vtk.util.numpy_support as vtknp
+
+from . import Singleton
+from ..tools import utils
+from ..tools import rasterizer
+from ..path import RENDER_BACKEND, PLOT_SIZE, PREVIEW_PIXELS
+
+# off-screen contexts kept alive at the same time, the least recently used one is closed first
+MAX_RENDERS = 4
+# memory kept for render results, the least recently used ones are dropped first
+RENDER_CACHE_BYTES = 512 * 1024 * 1024
+
+class RenderStore(metaclass=Singleton):
+    def __init__(self):
+        # (width, height) -> off-screen plotter
+        self.renders: "OrderedDict[Tuple[int, int], pv.Plotter]" = OrderedDict()
+        # (width, height) -> {name: (source actor, resident render actor)}
+        self.resident_actors: Dict[Tuple[int, int], Dict[str, Tuple[pv.Actor, pv.Actor]]] = {}
+        # 'vtk' or 'numpy'
+        self.backend = RENDER_BACKEND
+        # (width, height) of the loaded image, the full resolution of the exports and PnP renders
+        self.render_size = PLOT_SIZE
+        # key -> (render result, nbytes)
+        self.cache: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+        self.cache_budget = RENDER_CACHE_BYTES
+        self.cache_nbytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def reset(self):
+        for render in self.renders.values(): render.close()
+        self.renders.clear()
+        self.resident_actors.clear()
+        self.clear_cache()
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.cache_nbytes = 0
+
+    def cache_info(self):
+        return EasyDict(hits=self.cache_hits, misses=self.cache_misses, entries=len(self.cache), nbytes=self.cache_nbytes, budget=self.cache_budget)
+
+    def cached(self, key, render):
+        """Returns the render result (an array or a dict of arrays) stored under key, render() is only called on a miss
+
+        The cached arrays are read-only, they are shared by every caller asking for the same key.
+        """
+        key = (self.backend,) + key
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            result = self.cache[key][0]
+        else:
+            self.cache_misses += 1
+            result = render()
+            arrays = list(result.values()) if isinstance(result, dict) else [result]
+            for array in arrays: array.flags.writeable = False
+            nbytes = sum(array.nbytes for array in arrays)
+            if nbytes <= self.cache_budget:
+                self.cache[key] = (result, nbytes)
+                self.cache_nbytes += nbytes
+                while self.cache_nbytes > self.cache_budget: self.cache_nbytes -= self.cache.popitem(last=False)[1][1]
+        return EasyDict(result) if isinstance(result, dict) else result
+
+    def preview_size(self, size=None):
+        """size (the full render size by default) scaled down to PREVIEW_PIXELS, the aspect ratio is kept"""
+        width, height = self.render_size if size is None else size
+        scale = min(1, math.sqrt(PREVIEW_PIXELS / (width * height)))
+        return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    def get_render(self, width, height):
+        size = (int(width), int(height))
+        if size in self.renders: self.renders.move_to_end(size)
+        else:
+            if len(self.renders) >= MAX_RENDERS:
+                evicted, render = self.renders.popitem(last=False)
+                self.resident_actors.pop(evicted, None)
+                render.close()
+            render = utils.create_render(*size)
+            # a single headlight for the shaded meshes, flat actors (image, mask) ignore it
+            render.add_light(pv.Light(light_type='headlight'))
+            render.disable()
+            self.renders[size] = render
+            self.resident_actors[size] = {}
+        return self.renders[size]
+
+    def remove_actor(self, name):
+        for size, actors in self.resident_actors.items():
+            if name in actors: self.renders[size].remove_actor(actors.pop(name)[1], render=False)
+
+    def get_resident_actor(self, size, name, actor):
+        """Returns the copy of actor kept in the render context of size, it is only created once per source actor"""
+        actors = self.resident_actors[size]
+        if name in actors and actors[name][0] is actor: return actors[name][1]
+        if name in actors: self.renders[size].remove_actor(actors[name][1], render=False)
+        # a mapper of its own, on the same pipeline output, so every context keeps its own uploaded buffers
+        mapper = vtk.vtkDataSetMapper()
+        mapper.SetInputConnection(actor.GetMapper().GetInputConnection(0, 0))
+        render_actor = pv.Actor(mapper=mapper)
+        render_actor.SetPickable(False)
+        self.renders[size].add_actor(render_actor, pickable=False, reset_camera=False)
+        actors[name] = (actor, render_actor)
+        return render_actor
+
+    def render_actors(self, actors, camera, size):
+        """Renders the {name: actor} pairs off-screen at size (width, height) and returns the rgb image
+
+        Only the camera, the actor matrices and the display settings are updated between renders, the
+        geometry of an actor is uploaded again only if its data changed.
+        """
+        if self.use_rasterizer(actors): return rasterizer.render_actors(actors, camera, size).color
+        render = self.sync_actors(actors, camera, size)
+        render.render()
+        return render.screenshot(return_img=True)
+
+    def sync_actors(self, actors, camera, size):
+        """Shows only the resident copies of actors in the render context of size, with their current settings and camera"""
+        render = self.get_render(*size)
+        size = (int(size[0]), int(size[1]))
+        for name, (_, render_actor) in self.resident_actors[size].items(): render_actor.SetVisibility(name in actors)
+        for name, actor in actors.items():
+            render_actor = self.get_resident_actor(size, name, actor)
+            # vtkMapper.ShallowCopy copies the color settings (scalar mode, selected array, lut) but not the input
+            render_actor.GetMapper().ShallowCopy(actor.GetMapper())
+            render_actor.GetProperty().DeepCopy(actor.GetProperty())
+            render_actor.GetProperty().SetOpacity(1)
+            render_actor.GetProperty().SetRepresentationToSurface()
+            render_actor.user_matrix = pv.array_from_vtkmatrix(actor.GetMatrix())
+        render.camera = camera
+        return render
+
+    def render_poses(self, name, actor, matrices, camera, size, mask=False):
+        """Renders actor once per world matrix of matrices (N, 4, 4), returns (N, h, w, 3) rgb images or (N, h, w) binary masks
+
+        The settings of the actor and the camera are synced once, only the matrix changes between the frames and
+        they are read straight from the window. Masks are flat and not anti-aliased, so they are exactly binary.
+        """
+        width, height = int(size[0]), int(size[1])
+        matrices = np.asarray(matrices).reshape((-1, 4, 4))
+        if self.use_rasterizer({name: actor}):
+            images = np.empty((len(matrices), height, width) + (() if mask else (3,)), dtype=np.uint8)
+            for i, matrix in enumerate(matrices):
+                buffers = rasterizer.render_actors({name: actor}, camera, (width, height), [matrix])
+                images[i] = (buffers.instance > 0) if mask else buffers.color
+            return images
+
+        render = self.sync_actors({name: actor}, camera, (width, height))
+        render_actor = self.resident_actors[(width, height)][name][1]
+        multi_samples = render.render_window.GetMultiSamples()
+        if mask:
+            render_actor.GetMapper().SetScalarVisibility(0)
+            render_actor.GetProperty().SetLighting(False)
+            render_actor.GetProperty().SetColor(1, 1, 1)
+            render.render_window.SetMultiSamples(0)
+
+        images = np.empty((len(matrices), height, width, 3), dtype=np.uint8)
+        pixels = vtk.vtkUnsignedCharArray()
+        for i, matrix in enumerate(matrices):
+            render_actor.user_matrix = matrix
+            render.render()
+            # the front buffer is the resolved frame, like the screenshots
+            render.render_window.GetPixelData(0, 0, width - 1, height - 1, 1, pixels, 0)
+            images[i] = vtknp.vtk_to_numpy(pixels).reshape((height, width, 3))[::-1]
+
+        if mask:
+            render.render_window.SetMultiSamples(multi_samples)
+            render_actor.GetProperty().SetLighting(True)
+            return images[..., 0] // 255
+        return images
+
+    def render_buffers(self, actors, camera, size, mask_actor=None):
+        """Renders the {name: actor} pairs once and returns the buffers of that pass
+
+        color     (h, w, 3) uint8 rgb image
+        depth     (h, w) float distance from the camera along the view direction, nan on the background
+        instance  (h, w) uint16, 0 on the background and i + 1 where the i-th actor is visible
+        mask      (h, w) uint8, the mask_actor polygon projected with the camera, or the foreground of the actors
+        """
+        width, height = int(size[0]), int(size[1])
+        if self.use_rasterizer(actors): buffers = rasterizer.render_actors(actors, camera, (width, height))
+        else:
+            buffers = EasyDict(color=self.render_actors(actors, camera, (width, height)))
+            # the z-buffer of the same pass
+            buffers.depth = -self.renders[(width, height)].get_image_depth(fill_value=np.nan, reset_camera_clipping_range=False)
+            if len(actors) > 1: buffers.instance = self.render_instance(actors, (width, height), np.isfinite(buffers.depth))
+            else: buffers.instance = np.isfinite(buffers.depth).astype(np.uint16)
+        if mask_actor is not None:
+            polygon = utils.project_points(utils.get_mask_actor_points(mask_actor), camera, width, height)
+            buffers.mask = utils.fill_polygon_mask(polygon, width, height)
+        else: buffers.mask = (buffers.instance > 0).astype(np.uint8)
+        return buffers
+
+    def use_rasterizer(self, actors):
+        # the rasterizer only draws triangle meshes, the image plane always goes through vtk
+        return self.backend == 'numpy' and all(isinstance(actor.GetMapper().GetInput(), vtk.vtkPolyData) for actor in actors.values())
+
+    def render_instance(self, actors, size, foreground):
+        # several actors can only be told apart by an extra flat colored pass, one actor does not need it
+        render = self.renders[size]
+        resident_actors = self.resident_actors[size]
+        for i, name in enumerate(actors):
+            render_actor = resident_actors[name][1]
+            render_actor.GetMapper().SetScalarVisibility(0)
+            render_actor.GetProperty().SetLighting(False)
+            render_actor.GetProperty().SetColor(((i + 1) & 255) / 255, ((i + 1) >> 8) / 255, 0)
+        # anti-aliasing would blend the ids on the edges, the colors are synced again by the next render
+        multi_samples = render.render_window.GetMultiSamples()
+        render.render_window.SetMultiSamples(0)
+        render.render()
+        ids = render.screenshot(return_img=True).astype(np.uint16)
+        render.render_window.SetMultiSamples(multi_samples)
+        for name in actors: resident_actors[name][1].GetProperty().SetLighting(True)
+        instance = ids[..., 0] + (ids[..., 1] << 8)
+        instance[~foreground] = 0
+        return instance
@@ -12,7 +12,6 @@ import os
 import pathlib
 
 import numpy as np
-import PIL.Image
 from PyQt5 import QtWidgets
 
 from ..tools import utils
@@ -29,9 +28,11 @@ class FolderContainer:
                 toggle_register,
                 add_folder,
                 load_mask,
+                export_worker,
                 output_text):
         
         self.plotter = plotter
+        self.export_worker = export_worker
         self.play_video_button = play_video_button
         self.toggle_register = toggle_register
         self.add_folder = add_folder
@@ -52,11 +53,10 @@ class FolderContainer:
             if self.image_store.image_actor is not None:
                 os.makedirs(pathlib.Path(self.folder_store.folder_path) / "vision6D" / "images", exist_ok=True)
                 output_image_path = pathlib.Path(self.folder_store.folder_path) / "vision6D" / "images" / f"{id}.png"
-                image_rendered = self.image_store.render_image(camera=self.plotter.camera.copy())
-                save_image = PIL.Image.fromarray(image_rendered)
-                save_image.save(output_image_path)
+                image_rendered = self.image_store.get_image(camera=self.plotter.camera.copy())
+                self.export_worker.submit(output_image_path, image_rendered, f"-> Save image {self.folder_store.current_image} to {str(output_image_path)}")
+                # queued for export, the readers of the path flush the export worker first
                 self.image_store.image_path = str(output_image_path)
-                self.output_text.append(f"-> Save image {self.folder_store.current_image} to {str(output_image_path)}")
 
             if len(self.mesh_store.meshes) > 0:
                 os.makedirs(pathlib.Path(self.folder_store.folder_path) / "vision6D" / "poses", exist_ok=True)
@@ -64,6 +64,7 @@ class FolderContainer:
                 mesh_data = self.mesh_store.meshes[self.mesh_store.reference]
                 self.toggle_register(mesh_data.actor.user_matrix)
                 np.save(output_pose_path, mesh_data.actor.user_matrix)
+                self.mesh_store.write_model_state(mesh_data, output_pose_path.with_suffix(".json"))
                 self.output_text.append(f"-> Save image {self.folder_store.current_image} pose to {str(output_pose_path)}:")
                 text = "[[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}]]\n".format(
                 mesh_data.actor.user_matrix[0, 0], mesh_data.actor.user_matrix[0, 1], mesh_data.actor.user_matrix[0, 2], mesh_data.actor.user_matrix[0, 3], 
@@ -71,6 +72,12 @@ class FolderContainer:
                 mesh_data.actor.user_matrix[2, 0], mesh_data.actor.user_matrix[2, 1], mesh_data.actor.user_matrix[2, 2], mesh_data.actor.user_matrix[2, 3],
                 mesh_data.actor.user_matrix[3, 0], mesh_data.actor.user_matrix[3, 1], mesh_data.actor.user_matrix[3, 2], mesh_data.actor.user_matrix[3, 3])
                 self.output_text.append(text)
+                # the color render of the reference mesh is the input of the batch PnP (vision6D-pnp), rasterized on the export worker
+                colors = utils.get_mesh_actor_scalars(mesh_data.actor)
+                if colors is not None and not np.all(colors == colors[0]):
+                    os.makedirs(pathlib.Path(self.folder_store.folder_path) / "vision6D" / "renders", exist_ok=True)
+                    output_render_path = pathlib.Path(self.folder_store.folder_path) / "vision6D" / "renders" / f"{id}.png"
+                    self.export_worker.submit(output_render_path, self.mesh_store.snapshot_mesh(camera=self.plotter.camera.copy()), f"-> Save image {self.folder_store.current_image} mesh render to {output_render_path}")
         
             # save mask if there is a mask  
             if self.mask_store.mask_actor is not None:
@@ -78,11 +85,9 @@ class FolderContainer:
                 output_mask_path = pathlib.Path(self.folder_store.folder_path) / "vision6D" / "masks" / f"{id}.png"
                 mask_surface = self.mask_store.update_mask()
                 self.load_mask(mask_surface)
-                image = self.mask_store.render_mask(camera=self.plotter.camera.copy())
-                rendered_image = PIL.Image.fromarray(image)
-                rendered_image.save(output_mask_path)
+                self.export_worker.submit(output_mask_path, self.mask_store.snapshot_mask(camera=self.plotter.camera.copy()), f"-> Save image {self.folder_store.current_image} mask render to {output_mask_path}")
+                # queued for export, the readers of the path flush the export worker first
                 self.mask_store.mask_path = output_mask_path
-                self.output_text.append(f"-> Save image {self.folder_store.current_image} mask render to {output_mask_path}")
 
             # save bbox if there is a bbox  
             if self.bbox_store.bbox_actor is not None:
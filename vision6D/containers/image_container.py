@@ -25,9 +25,11 @@ class ImageContainer:
                 hintLabel,
                 track_actors_names, 
                 add_button_actor_name,
+                export_worker,
                 output_text):
           
         self.plotter = plotter
+        self.export_worker = export_worker
         self.hintLabel = hintLabel
         self.track_actors_names = track_actors_names
         self.add_button_actor_name = add_button_actor_name
@@ -38,15 +40,21 @@ class ImageContainer:
     #^ Camera related
     def camera_calibrate(self):
         if self.image_store.image_path:
+            # the image path can be a saved frame still queued for export
+            self.export_worker.flush()
             original_image = np.array(PIL.Image.open(self.image_store.image_path), dtype='uint8')
             # make the the original image shape is [h, w, 3] to match with the rendered calibrated_image
             original_image = original_image[..., :3]
             if len(original_image.shape) == 2: original_image = original_image[..., None]
             if original_image.shape[-1] == 1: original_image = np.dstack((original_image, original_image, original_image))
-            calibrated_image = np.array(self.image_store.render_image(self.plotter.camera.copy()), dtype='uint8')
-            if original_image.shape != calibrated_image.shape:
+            if original_image.shape[:2] != (self.image_store.height, self.image_store.width):
                 utils.display_warning("Original image shape is not equal to calibrated image shape!")
-            else: CalibrationDialog(calibrated_image, original_image).exec_()
+            else:
+                # the dialog only shows the two images side by side, both are compared at the preview size
+                size = self.image_store.render_store.preview_size((self.image_store.width, self.image_store.height))
+                calibrated_image = np.array(self.image_store.render_image(self.plotter.camera.copy(), size), dtype='uint8')
+                original_image = np.array(PIL.Image.fromarray(original_image).resize(size, PIL.Image.BILINEAR), dtype='uint8')
+                CalibrationDialog(calibrated_image, original_image).exec_()
         else: utils.display_warning("Need to load an image first!")
 
     def set_camera(self):
@@ -115,9 +123,7 @@ class ImageContainer:
             output_path, _ = QtWidgets.QFileDialog.getSaveFileName(QtWidgets.QMainWindow(), "Save File", "", "Image Files (*.png)")
             if output_path:
                 if pathlib.Path(output_path).suffix == '': output_path = pathlib.Path(output_path).parent / (pathlib.Path(output_path).stem + '.png')
-                image_rendered = self.image_store.render_image(camera=self.plotter.camera.copy())
-                rendered_image = PIL.Image.fromarray(image_rendered)
-                rendered_image.save(output_path)
-                self.output_text.append(f"-> Export image render to:\n {output_path}")
+                image_rendered = self.image_store.get_image(camera=self.plotter.camera.copy())
+                self.export_worker.submit(output_path, image_rendered, f"-> Export image render to:\n {output_path}")
             self.image_store.image_path = output_path
         else: utils.display_warning("Need to load an image first!")
\ No newline at end of file
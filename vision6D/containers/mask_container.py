@@ -12,12 +12,11 @@ import ast
 import pathlib
 
 import numpy as np
-import PIL.Image
 import matplotlib.colors
 
 from PyQt5 import QtWidgets
 
-from ..path import PKG_ROOT, PLOT_SIZE
+from ..path import PKG_ROOT
 from ..tools import utils, exception
 from ..components import ImageStore
 from ..components import MaskStore
@@ -29,9 +28,11 @@ class MaskContainer:
                 hintLabel,
                 track_actors_names, 
                 add_button_actor_name,
+                export_worker,
                 output_text):
 
         self.plotter = plotter
+        self.export_worker = export_worker
         self.hintLabel = hintLabel
         self.track_actors_names = track_actors_names
         self.add_button_actor_name = add_button_actor_name
@@ -69,6 +70,8 @@ class MaskContainer:
     def mirror_mask(self, direction):
         if direction == 'x': self.mask_store.mirror_x = not self.mask_store.mirror_x
         elif direction == 'y': self.mask_store.mirror_y = not self.mask_store.mirror_y
+        # the mask path can be a saved mask still queued for export
+        self.export_worker.flush()
         self.add_mask(self.mask_store.mask_path)
 
     def load_mask(self, mask_surface):
@@ -78,7 +81,7 @@ class MaskContainer:
         self.mask_store.mask_actor = actor
         
     def add_mask(self, mask_source):
-        mask_surface = self.mask_store.add_mask(mask_source, self.image_store.object_distance, PLOT_SIZE)
+        mask_surface = self.mask_store.add_mask(mask_source, self.image_store.object_distance, self.image_store.render_store.render_size)
         self.load_mask(mask_surface)
         
         # Add remove current image to removeMenu
@@ -88,9 +91,10 @@ class MaskContainer:
     
     def reset_mask(self):
         if self.mask_store.mask_path:
+            self.export_worker.flush()
             self.mask_store.mirror_x = False
             self.mask_store.mirror_y = False
-            mask_surface = self.mask_store.add_mask(self.mask_store.mask_path, self.image_store.object_distance, PLOT_SIZE)
+            mask_surface = self.mask_store.add_mask(self.mask_store.mask_path, self.image_store.object_distance, self.image_store.render_store.render_size)
             self.load_mask(mask_surface)
 
     def set_mask_opacity(self, mask_opacity: float):
@@ -121,9 +125,6 @@ class MaskContainer:
                 # Store the transformed mask actor if there is any transformation
                 mask_surface = self.mask_store.update_mask()
                 self.load_mask(mask_surface)
-                image = self.mask_store.render_mask(camera=self.plotter.camera.copy())
-                rendered_image = PIL.Image.fromarray(image)
-                rendered_image.save(output_path)
-                self.output_text.append(f"-> Export mask render to:\n {output_path}")
+                self.export_worker.submit(output_path, self.mask_store.snapshot_mask(camera=self.plotter.camera.copy()), f"-> Export mask render to:\n {output_path}")
             self.mask_store.mask_path = output_path
         else: utils.display_warning("Need to load a mask first!")
\ No newline at end of file
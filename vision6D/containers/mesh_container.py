@@ -11,7 +11,6 @@ import os
 import pathlib
 
 import trimesh
-import PIL.Image
 import matplotlib
 import numpy as np
 import pyvista as pv
@@ -37,6 +36,7 @@ class MeshContainer:
                 reset_camera,
                 toggle_register,
                 load_mask,
+                export_worker,
                 output_text):
 
         self.plotter = plotter
@@ -48,6 +48,7 @@ class MeshContainer:
         self.reset_camera = reset_camera
         self.toggle_register = toggle_register
         self.load_mask = load_mask
+        self.export_worker = export_worker
         self.output_text = output_text
         
         self.toggle_hide_meshes_flag = False
@@ -60,18 +61,32 @@ class MeshContainer:
             mesh_path, _ = QtWidgets.QFileDialog().getOpenFileName(None, "Open file", "", "Files (*.mesh *.ply *.stl *.obj *.off *.dae *.fbx *.3ds *.x3d)") 
         if mesh_path:
             self.hintLabel.hide()
-            mesh_data = self.mesh_store.add_mesh(mesh_source=mesh_path)
-            if mesh_data: 
-                if self.mesh_store.reference is not None:
-                    name = self.mesh_store.reference
-                    reference_matrix = self.mesh_store.meshes[name].actor.user_matrix
-                    self.add_mesh(mesh_data, reference_matrix)
-                else:
-                    self.add_mesh(mesh_data, np.array([[1, 0, 0, 0], 
-                                                    [0, 1, 0, 0], 
-                                                    [0, 0, 1, 1], 
-                                                    [0, 0, 0, 1]])) # set the initial pose, r_x, r_y, t_z includes the scaling too
-            else: utils.display_warning("The mesh format is not supported!")
+            self.add_mesh_data(self.mesh_store.add_mesh(mesh_source=mesh_path))
+
+    def add_mesh_files(self, mesh_paths, poses=None):
+        """ parse all meshes concurrently, then add them to the plot in the given order """
+        if poses is None: poses = [None] * len(mesh_paths)
+        # blank entries (e.g. a trailing line of mesh_path.txt) are skipped together with their pose
+        pairs = [(mesh_path, pose) for mesh_path, pose in zip(mesh_paths, poses) if mesh_path]
+        if pairs: self.hintLabel.hide()
+        for (_, mesh_data), (_, pose) in zip(self.mesh_store.load_meshes([mesh_path for mesh_path, _ in pairs]), pairs):
+            if mesh_data: self.mesh_store.register_mesh(mesh_data)
+            if self.add_mesh_data(mesh_data) and pose is not None: self.add_pose_file(pose)
+
+    def add_mesh_data(self, mesh_data):
+        if mesh_data:
+            if self.mesh_store.reference is not None:
+                name = self.mesh_store.reference
+                reference_matrix = self.mesh_store.meshes[name].actor.user_matrix
+                self.add_mesh(mesh_data, reference_matrix)
+            else:
+                self.add_mesh(mesh_data, np.array([[1, 0, 0, 0],
+                                                [0, 1, 0, 0],
+                                                [0, 0, 1, 1],
+                                                [0, 0, 0, 1]])) # set the initial pose, r_x, r_y, t_z includes the scaling too
+            return True
+        utils.display_warning("The mesh format is not supported!")
+        return False
 
     def mirror_mesh(self, name, direction):
         if self.mesh_store.toggle_anchor_mesh: name = self.mesh_store.reference
@@ -108,6 +123,7 @@ class MeshContainer:
         mesh.user_matrix = transformation_matrix
         actor, _ = self.plotter.add_actor(mesh, pickable=True, name=mesh_data.name)
         mesh_data.actor = actor
+        self.mesh_store.apply_spacing(mesh_data)
 
         # add remove current mesh to removeMenu
         if mesh_data.name not in self.track_actors_names:
@@ -128,37 +144,30 @@ class MeshContainer:
             if name in self.mesh_store.meshes:
                 mesh_data = self.mesh_store.meshes[name]
                 spacing, ok = QtWidgets.QInputDialog().getText(QtWidgets.QMainWindow(), 'Input', "Set Spacing", text=str(mesh_data.spacing))
-                if ok:
-                    mesh_data.spacing = exception.set_spacing(spacing)
-                    # Calculate the centroid
-                    centroid = np.mean(mesh_data.source_mesh.vertices, axis=0)
-                    offset = mesh_data.source_mesh.vertices - centroid
-                    scaled_offset = offset * mesh_data.spacing
-                    vertices = centroid + scaled_offset
-                    mesh_data.pv_mesh.points = vertices
+                if ok: self.mesh_store.set_spacing(mesh_data, exception.set_spacing(spacing))
             else: utils.display_warning("Need to select a mesh object instead")
         else: utils.display_warning("Need to select a mesh actor first")
         
     def set_color(self, color, name):
         mesh_data = self.mesh_store.meshes[name]
+        # the colors are point arrays of the mesh picked on the existing mapper, the actor and the geometry stay as they are
         if color in self.mesh_store.colors:
-            mesh_data.actor.GetMapper().SetScalarVisibility(0)
+            utils.set_mesh_actor_scalars(mesh_data.actor, None)
             mesh_data.actor.GetProperty().SetColor(matplotlib.colors.to_rgb(color))
         else:
-            if color == "nocs": scalars = utils.color_mesh_nocs(mesh_data.pv_mesh.points)
+            if color == "nocs":
+                # the nocs colors of the loaded geometry come with the mesh cache
+                mesh_data.pv_mesh.point_data['nocs'] = self.mesh_store.get_nocs_colors(mesh_data)
             else: 
                 texture_path, _ = QtWidgets.QFileDialog().getOpenFileName(None, "Open file", "", "Files (*.npy)")
-                if texture_path: scalars = np.load(texture_path) / 255 # make sure the color range is from 0 to 1
-            mesh = self.plotter.add_mesh(mesh_data.pv_mesh, scalars=scalars, rgb=True, opacity=mesh_data.opacity, name=name)
-            mesh.user_matrix = mesh_data.actor.user_matrix
-            actor, _ = self.plotter.add_actor(mesh, pickable=True, name=name)
-            mesh_data.actor = actor #^ very import to change the actor too!
+                if texture_path: mesh_data.pv_mesh.point_data['texture'] = np.load(texture_path) / 255 # make sure the color range is from 0 to 1
+                elif 'texture' not in mesh_data.pv_mesh.point_data: raise ValueError("No texture is loaded")
+            utils.set_mesh_actor_scalars(mesh_data.actor, color)
             
     def set_mesh_opacity(self, name: str, mesh_opacity: float):
         mesh_data = self.mesh_store.meshes[name]
         mesh_data.previous_opacity = mesh_data.opacity
         mesh_data.opacity = mesh_opacity
-        mesh_data.actor.user_matrix = pv.array_from_vtkmatrix(mesh_data.actor.GetMatrix())
         mesh_data.actor.GetProperty().opacity = mesh_opacity
 
     def toggle_surface_opacity(self, up):
@@ -275,7 +284,8 @@ class MeshContainer:
         else:
             for mesh_data in self.mesh_store.meshes.values():
                 verts, faces = utils.get_mesh_actor_vertices_faces(mesh_data.actor)
-                vertices = utils.transform_vertices(verts, mesh_data.actor.user_matrix)
+                # the actor matrix includes the spacing
+                vertices = utils.transform_vertices(verts, pv.array_from_vtkmatrix(mesh_data.actor.GetMatrix()))
                 os.makedirs(PKG_ROOT.parent / "output" / "export_mesh", exist_ok=True)
                 output_path = PKG_ROOT.parent / "output" / "export_mesh" / (mesh_data.name + '.ply')
                 mesh = trimesh.Trimesh(vertices, faces, process=False)
@@ -283,6 +293,14 @@ class MeshContainer:
                 with open(output_path, "wb") as fid: fid.write(ply_file)
                 self.output_text.append(f"Export {mesh_data.name} mesh to:\n {output_path}")
                 
+    def export_meshes(self):
+        if len(self.mesh_store.meshes) > 0:
+            output_dir = QtWidgets.QFileDialog.getExistingDirectory(QtWidgets.QMainWindow(), "Select Folder")
+            if output_dir:
+                output_paths = self.mesh_store.export_meshes(output_dir)
+                for output_path in output_paths: self.output_text.append(f"-> Export mesh to:\n {output_path}")
+        else: utils.display_warning("Need to load a mesh first")
+
     def export_mesh_render(self, save_render=True):
         image = None
         if self.mesh_store.reference:
@@ -291,9 +309,7 @@ class MeshContainer:
                 output_path, _ = QtWidgets.QFileDialog.getSaveFileName(QtWidgets.QMainWindow(), "Save File", "", "Mesh Files (*.png)")
                 if output_path:
                     if pathlib.Path(output_path).suffix == '': output_path = pathlib.Path(output_path).parent / (pathlib.Path(output_path).stem + '.png')
-                    rendered_image = PIL.Image.fromarray(image)
-                    rendered_image.save(output_path)
-                    self.output_text.append(f"-> Export mesh render to:\n {output_path}")
+                    self.export_worker.submit(output_path, image, f"-> Export mesh render to:\n {output_path}")
         else: QtWidgets.QMessageBox.warning(QtWidgets.QMainWindow(), "vision6D", "Need to load a mesh first", QtWidgets.QMessageBox.Ok, QtWidgets.QMessageBox.Ok)
         return image
 
@@ -304,11 +320,6 @@ class MeshContainer:
                 if pathlib.Path(output_path).suffix == '': output_path = pathlib.Path(output_path).parent / (pathlib.Path(output_path).stem + '.png')
                 mask_surface = self.mask_store.update_mask()
                 self.load_mask(mask_surface)
-                segmask = self.mask_store.render_mask(camera=self.plotter.camera.copy())
-                if np.max(segmask) > 1: segmask = segmask / 255
-                image = self.mesh_store.render_mesh(camera=self.plotter.camera.copy())
-                image = (image * segmask).astype(np.uint8)
-                rendered_image = PIL.Image.fromarray(image)
-                rendered_image.save(output_path)
-                self.output_text.append(f"-> Export segmask render:\n to {output_path}")
+                buffers = self.mesh_store.render_mesh_buffers(camera=self.plotter.camera.copy(), mask_actor=self.mask_store.mask_actor)
+                self.export_worker.submit(output_path, lambda: buffers.color * buffers.mask[..., None], f"-> Export segmask render:\n to {output_path}")
         else: utils.display_warning("Need to load a mesh or mask first")
@@ -9,47 +9,92 @@
 '''
 
 import math
+import pathlib
 
-import trimesh
 import numpy as np
 import matplotlib.pyplot as plt
 
 from ..tools import utils
+from ..tools import latlon
 from ..components import ImageStore
 from ..components import MaskStore
 from ..components import MeshStore
+from ..components import VideoStore
 from .. import path
 
 class PnPContainer:
-    def __init__(self, plotter, export_mesh_render, output_text):
+    def __init__(self, plotter, output_text):
         self.plotter = plotter
-        self.export_mesh_render = export_mesh_render
         self.output_text = output_text
         
         self.image_store = ImageStore()
         self.mask_store = MaskStore()
         self.mesh_store = MeshStore()
+        self.video_store = VideoStore()
 
-    def nocs_epnp(self, color_mask, mesh):
-        vertices = mesh.vertices
-        pts3d, pts2d = utils.create_2d_3d_pairs(color_mask, vertices)
-        pts2d = pts2d.astype('float32')
-        pts3d = pts3d.astype('float32')
+    def get_camera_intrinsics(self):
         camera_intrinsics = self.image_store.camera_intrinsics.astype('float32')
         focal_length = (self.image_store.height / 2.0) / math.tan(math.radians(self.plotter.camera.view_angle / 2))
         camera_intrinsics[0, 0] = focal_length
         camera_intrinsics[1, 1] = focal_length
-        predicted_pose = utils.solve_epnp_cv2(pts2d, pts3d, camera_intrinsics)
+        return camera_intrinsics, focal_length
+
+    def render_reference(self, mask_actor=None):
+        # the other shown meshes are rendered as well, the reference pixels they cover are left out. Hidden meshes only
+        # get opacity 0 and the off-screen renders draw every actor opaque, so they are not passed in
+        names = [self.mesh_store.reference] + [name for name, mesh_data in self.mesh_store.meshes.items()
+                                               if name != self.mesh_store.reference and mesh_data.actor.GetVisibility() and mesh_data.opacity > 0]
+        buffers = self.mesh_store.render_mesh_buffers(camera=self.plotter.camera.copy(), mask_actor=mask_actor, names=names)
+        visible = buffers.instance == 1
+        if mask_actor is not None: visible &= buffers.mask.astype(bool)
+        buffers.color = buffers.color * visible[..., None]
+        buffers.depth = np.where(visible, buffers.depth, np.nan)
+        return buffers
+
+    def get_previous_pose(self, mesh_data, conjugate=True):
+        """Pose saved for the previous sampled frame of the video, None outside of a video or if it was not saved
+
+        The pose is mirrored into the frame the solver works in, see utils.mirror_initial_pose.
+        """
+        if not self.video_store.video_path: return None
+        video_path = pathlib.Path(self.video_store.video_path)
+        pose_path = video_path.parent / f"{video_path.stem}_vision6D" / "poses" / f"pose_{self.video_store.current_frame - self.video_store.fps}.npy"
+        if not pose_path.is_file(): return None
+        return utils.mirror_initial_pose(np.load(pose_path), mesh_data.mirror_x, mesh_data.mirror_y, conjugate)
+
+    def solve_pose(self, pts2d, pts3d, camera_intrinsics, initial_pose=None):
+        if initial_pose is None: return utils.solve_epnp_cv2(pts2d, pts3d, camera_intrinsics)
+        # smooth video: a short refinement of the previous frame's pose, RANSAC only if it does not fit
+        predicted_pose, warm_start = utils.solve_pnp_warm_start(pts2d, pts3d, camera_intrinsics, initial_pose)
+        if warm_start: self.output_text.append("-> Refined the pose of the previous frame")
+        else: self.output_text.append("-> The pose of the previous frame does not fit, solved with EPnP RANSAC")
+        return predicted_pose
+
+    def nocs_epnp(self, color_mask, mesh, initial_pose=None, depth=None):
+        """Solves the pose from the nocs colors of color_mask, leaving out the pixels on the depth edges of depth if given"""
+        camera_intrinsics, focal_length = self.get_camera_intrinsics()
+        binary_mask = utils.color2binary_mask(color_mask)
+        if depth is not None:
+            # keep every pixel when the surface is too thin to have an inside
+            inside = binary_mask * ~utils.depth_edges(depth)[..., None]
+            if np.count_nonzero(inside) >= 4: binary_mask = inside
+        pts3d, pts2d = utils.create_2d_3d_pairs(color_mask, mesh.vertices, binary_mask)
+        sample = utils.sample_correspondences(pts2d, path.PNP_SAMPLING, path.PNP_MAX_POINTS)
+        pts2d, pts3d = pts2d[sample], pts3d[sample]
+        pts2d = pts2d.astype('float32')
+        pts3d = pts3d.astype('float32')
+        predicted_pose = self.solve_pose(pts2d, pts3d, camera_intrinsics, initial_pose)
         self.output_text.append(f"-> Focal length is {focal_length}: ")
         return predicted_pose
 
-    def latlon_epnp(self, color_mask, mesh):
+    def latlon_epnp(self, color_mask, mesh, initial_pose=None):
         binary_mask = utils.color2binary_mask(color_mask)
         idx = np.where(binary_mask == 1)
         # swap the points for opencv, maybe because they handle RGB image differently (RGB -> BGR in opencv)
         idx = idx[:2][::-1]
         pts2d = np.stack((idx[0], idx[1]), axis=1)
-        pts3d = []
+        # the pixels are sampled before their 3D points are looked up
+        pts2d = pts2d[utils.sample_correspondences(pts2d, path.PNP_SAMPLING, path.PNP_MAX_POINTS)]
         
         # Obtain the rg color
         color = color_mask[pts2d[:,1], pts2d[:,0]][..., :2]
@@ -59,21 +104,15 @@ class PnPContainer:
 
         lat = np.array(self.mesh_store.latlon[..., 0])
         lon = np.array(self.mesh_store.latlon[..., 1])
-        lonf = lon[mesh.faces]
-        msk = (np.sum(lonf>=0, axis=1)==3) & (np.sum(lat[mesh.faces]>=0, axis=1)==3)
-        for i in range(len(pts2d)):
-            pt = utils.latLon2xyz(mesh, lat, lonf, msk, gx[i], gy[i])
-            pts3d.append(pt)
-       
-        pts3d = np.array(pts3d).reshape((len(pts3d), 3))
+        # the inverse mapping is solved once per mesh on a grid cached on disk, a pixel looks up its nearest node. The grid
+        # holds faces and barycentric weights, the spacing and the baked poses of the vertices do not rebuild it
+        grid = latlon.load_grid(mesh.faces, lat, lon)
+        pts3d = latlon.sample_grid(grid, mesh.vertices, mesh.faces, gx, gy)
 
         pts2d = pts2d.astype('float32')
         pts3d = pts3d.astype('float32')
-        camera_intrinsics = self.image_store.camera_intrinsics.astype('float32')
-        focal_length = (self.image_store.height / 2.0) / math.tan(math.radians(self.plotter.camera.view_angle / 2))
-        camera_intrinsics[0, 0] = focal_length
-        camera_intrinsics[1, 1] = focal_length
-        predicted_pose = utils.solve_epnp_cv2(pts2d, pts3d, camera_intrinsics)
+        camera_intrinsics, focal_length = self.get_camera_intrinsics()
+        predicted_pose = self.solve_pose(pts2d, pts3d, camera_intrinsics, initial_pose)
         self.output_text.append(f"-> Focal length is {focal_length}: ")
         return predicted_pose
 
@@ -82,16 +121,16 @@ class PnPContainer:
             mesh_data = self.mesh_store.meshes[self.mesh_store.reference]
             colors = utils.get_mesh_actor_scalars(mesh_data.actor)
             if colors is not None and (not np.all(colors == colors[0])):
-                color_mask = self.export_mesh_render(save_render=False)
+                buffers = self.render_reference()
+                color_mask = buffers.color
                 gt_pose = mesh_data.actor.user_matrix
                 if mesh_data.mirror_x: gt_pose = np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ gt_pose
                 if mesh_data.mirror_y: gt_pose = np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ gt_pose
 
                 if color_mask is not None and np.sum(color_mask):
                     if mesh_data.color == 'nocs':
-                        vertices, faces = utils.get_mesh_actor_vertices_faces(mesh_data.actor)
-                        mesh = trimesh.Trimesh(vertices, faces, process=False)
-                        predicted_pose = self.nocs_epnp(color_mask, mesh)
+                        mesh = mesh_data.source_mesh
+                        predicted_pose = self.nocs_epnp(color_mask, mesh, self.get_previous_pose(mesh_data), buffers.depth)
                         if mesh_data.mirror_x: predicted_pose = np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ predicted_pose @ np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
                         if mesh_data.mirror_y: predicted_pose = np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ predicted_pose @ np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
                         angular_distance = utils.angler_distance(predicted_pose[:3, :3], gt_pose[:3, :3])
@@ -117,29 +156,27 @@ class PnPContainer:
             else: utils.display_warning("The mesh need to be colored, with gradient color")
         else: utils.display_warning("A mesh need to be loaded/mesh reference need to be set")
 
-    def epnp_mask_handle_binary_mask(self, mask_data):
+    def epnp_mask_handle_binary_mask(self):
         if self.mesh_store.reference:
             mesh_data = self.mesh_store.meshes[self.mesh_store.reference]
             colors = utils.get_mesh_actor_scalars(mesh_data.actor)
             if colors is not None and (not np.all(colors == colors[0])):
-                color_mask = self.export_mesh_render(save_render=False)
+                # the mesh colors and the mask come out of the same render
+                buffers = self.render_reference(mask_actor=self.mask_store.mask_actor)
+                color_mask, depth = buffers.color, buffers.depth
                 nocs_color = (mesh_data.color == 'nocs')
                 gt_pose = mesh_data.actor.user_matrix
                 if mesh_data.mirror_x: gt_pose = np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ gt_pose
                 if mesh_data.mirror_y: gt_pose = np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ gt_pose
-                vertices, faces = utils.get_mesh_actor_vertices_faces(mesh_data.actor)
-                mesh = trimesh.Trimesh(vertices, faces, process=False)
+                mesh = mesh_data.source_mesh
             else: utils.display_warning("The mesh need to be colored, with gradient color")
         else: utils.display_warning("A mesh need to be loaded/mesh reference need to be set")
         
-        if color_mask is not None: color_mask = (color_mask * mask_data).astype(np.uint8)
-        else: utils.display_warning("Color mask is None")
-        
-        return mesh_data, color_mask, nocs_color, gt_pose, mesh
+        return mesh_data, color_mask, depth, nocs_color, gt_pose, mesh
     
-    def epnp_mask_nocs_theme(self, mesh_data, color_mask, mesh):
+    def epnp_mask_nocs_theme(self, mesh_data, color_mask, mesh, depth=None):
         color_theme = 'NOCS'
-        predicted_pose = self.nocs_epnp(color_mask, mesh)
+        predicted_pose = self.nocs_epnp(color_mask, mesh, self.get_previous_pose(mesh_data), depth)
         if mesh_data.mirror_x: predicted_pose = np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ predicted_pose @ np.array([[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
         if mesh_data.mirror_y: predicted_pose = np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ predicted_pose @ np.array([[1, 0, 0, 0], [0, -1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
         return color_theme, predicted_pose
@@ -148,18 +185,15 @@ class PnPContainer:
         color_theme = 'LATLON'
         if mesh_data.mirror_x: color_mask = color_mask[:, ::-1, :]
         if mesh_data.mirror_y: color_mask = color_mask[::-1, :, :]
-        predicted_pose = self.latlon_epnp(color_mask, mesh)
+        predicted_pose = self.latlon_epnp(color_mask, mesh, self.get_previous_pose(mesh_data, conjugate=False))
         return color_theme, predicted_pose
     
     def epnp_mask(self, nocs_method):
         if self.mask_store.mask_actor:
-            mask_data = self.mask_store.render_mask(camera=self.plotter.camera.copy())
-            if np.max(mask_data) > 1: mask_data = mask_data / 255
-            if np.all(np.logical_or(mask_data == 0, mask_data == 1)):
-                mesh_data, color_mask, nocs_color, gt_pose, mesh = self.epnp_mask_handle_binary_mask(mask_data)
+            mesh_data, color_mask, depth, nocs_color, gt_pose, mesh = self.epnp_mask_handle_binary_mask()
             if np.sum(color_mask):
                 if nocs_method == nocs_color:
-                    if nocs_method: color_theme, predicted_pose = self.epnp_mask_nocs_theme(mesh_data, color_mask, mesh)
+                    if nocs_method: color_theme, predicted_pose = self.epnp_mask_nocs_theme(mesh_data, color_mask, mesh, depth)
                     else: color_theme, predicted_pose = self.epnp_mask_latlon_theme(mesh_data, color_mask, mesh)
                     angular_distance = utils.angler_distance(predicted_pose[:3, :3], gt_pose[:3, :3])
                     translation_error = np.linalg.norm(predicted_pose[:3, 3] - gt_pose[:3, 3])
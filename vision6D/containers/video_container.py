@@ -12,7 +12,6 @@ import os
 import pathlib
 
 import numpy as np
-import PIL.Image
 
 from PyQt5 import QtWidgets
 
@@ -35,9 +34,11 @@ class VideoContainer:
                 add_image,
                 load_mask,
                 clear_plot,
+                export_worker,
                 output_text):
         
         self.plotter = plotter
+        self.export_worker = export_worker
         self.anchor_button = anchor_button
         self.play_video_button = play_video_button
         self.hintLabel = hintLabel
@@ -96,11 +97,10 @@ class VideoContainer:
             if self.image_store.image_actor is not None:
                 os.makedirs(pathlib.Path(self.video_store.video_path).parent / f"{pathlib.Path(self.video_store.video_path).stem}_vision6D" / "frames", exist_ok=True)
                 output_frame_path = pathlib.Path(self.video_store.video_path).parent / f"{pathlib.Path(self.video_store.video_path).stem}_vision6D" / "frames" / f"frame_{self.video_store.current_frame}.png"
-                image_rendered = self.image_store.render_image(camera=self.plotter.camera.copy())
-                save_frame = PIL.Image.fromarray(image_rendered)
-                save_frame.save(output_frame_path)
+                image_rendered = self.image_store.get_image(camera=self.plotter.camera.copy())
+                self.export_worker.submit(output_frame_path, image_rendered, f"-> Save frame {self.video_store.current_frame} to {str(output_frame_path)}")
+                # queued for export, the readers of the path flush the export worker first
                 self.image_store.image_path = str(output_frame_path)
-                self.output_text.append(f"-> Save frame {self.video_store.current_frame} to {str(output_frame_path)}")
         
             # save gt_pose for each frame if there are any meshes
             if len(self.mesh_store.meshes) > 0:
@@ -109,6 +109,7 @@ class VideoContainer:
                 mesh_data = self.mesh_store.meshes[self.mesh_store.reference]
                 self.toggle_register(mesh_data.actor.user_matrix)
                 np.save(output_pose_path, mesh_data.actor.user_matrix)
+                self.mesh_store.write_model_state(mesh_data, output_pose_path.with_suffix(".json"))
                 self.output_text.append(f"-> Save frame {self.video_store.current_frame} pose to {str(output_pose_path)}:")
                 text = "[[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}],\n[{:.4f}, {:.4f}, {:.4f}, {:.4f}]]\n".format(
                 mesh_data.actor.user_matrix[0, 0], mesh_data.actor.user_matrix[0, 1], mesh_data.actor.user_matrix[0, 2], mesh_data.actor.user_matrix[0, 3], 
@@ -116,6 +117,12 @@ class VideoContainer:
                 mesh_data.actor.user_matrix[2, 0], mesh_data.actor.user_matrix[2, 1], mesh_data.actor.user_matrix[2, 2], mesh_data.actor.user_matrix[2, 3],
                 mesh_data.actor.user_matrix[3, 0], mesh_data.actor.user_matrix[3, 1], mesh_data.actor.user_matrix[3, 2], mesh_data.actor.user_matrix[3, 3])
                 self.output_text.append(text)
+                # the color render of the reference mesh is the input of the batch PnP (vision6D-pnp), rasterized on the export worker
+                colors = utils.get_mesh_actor_scalars(mesh_data.actor)
+                if colors is not None and not np.all(colors == colors[0]):
+                    os.makedirs(pathlib.Path(self.video_store.video_path).parent / f"{pathlib.Path(self.video_store.video_path).stem}_vision6D" / "renders", exist_ok=True)
+                    output_render_path = pathlib.Path(self.video_store.video_path).parent / f"{pathlib.Path(self.video_store.video_path).stem}_vision6D" / "renders" / f"render_{self.video_store.current_frame}.png"
+                    self.export_worker.submit(output_render_path, self.mesh_store.snapshot_mesh(camera=self.plotter.camera.copy()), f"-> Save frame {self.video_store.current_frame} mesh render to {output_render_path}")
 
             # save mask if there is a mask  
             if self.mask_store.mask_actor is not None:
@@ -123,11 +130,9 @@ class VideoContainer:
                 output_mask_path = pathlib.Path(self.video_store.video_path).parent / f"{pathlib.Path(self.video_store.video_path).stem}_vision6D" / "masks" / f"mask_{self.video_store.current_frame}.png"
                 mask_surface = self.mask_store.update_mask()
                 self.load_mask(mask_surface)
-                image = self.mask_store.render_mask(camera=self.plotter.camera.copy())
-                rendered_image = PIL.Image.fromarray(image)
-                rendered_image.save(output_mask_path)
+                self.export_worker.submit(output_mask_path, self.mask_store.snapshot_mask(camera=self.plotter.camera.copy()), f"-> Save frame {self.video_store.current_frame} mask render to {output_mask_path}")
+                # queued for export, the readers of the path flush the export worker first
                 self.mask_store.mask_path = output_mask_path
-                self.output_text.append(f"-> Save frame {self.video_store.current_frame} mask render to {output_mask_path}")
 
             # save bbox if there is a bbox  
             if self.bbox_store.bbox_actor is not None:
@@ -0,0 +1,77 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: convert.py
+@time: 2026-10-17 14:05
+@desc: batch convert .mesh files (whole directory trees) to ply and other formats on a process pool
+'''
+
+import os
+import sys
+import time
+import pathlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from ..tools import utils
+
+def convert_file(job):
+    """Converts one file, returns (input size in bytes, error message or None)"""
+    input_path, output_path, double = job
+    # write next to the target first, an interrupted run must not leave an output that looks up to date
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.suffix == '.ply': utils.mesh2ply(input_path, tmp_path, double)
+        else: utils.load_trimesh(input_path).export(tmp_path, file_type=output_path.suffix[1:])
+        os.replace(tmp_path, output_path)
+        return input_path.stat().st_size, None
+    except Exception as e:
+        if tmp_path.exists(): tmp_path.unlink()
+        return 0, f"{input_path}: {e}"
+
+def collect_jobs(input_path, output_dir, suffix, force):
+    """Pairs every .mesh file under input_path with its output path, skipping outputs newer than their input"""
+    input_path = pathlib.Path(input_path)
+    if input_path.is_file(): root, input_paths = input_path.parent, [input_path]
+    else: root, input_paths = input_path, sorted(input_path.rglob("*.mesh"))
+    output_dir = pathlib.Path(output_dir) if output_dir else root
+
+    jobs, skipped = [], 0
+    for path in input_paths:
+        output_path = (output_dir / path.relative_to(root)).with_suffix(suffix)
+        if not force and output_path.exists() and output_path.stat().st_mtime_ns >= path.stat().st_mtime_ns: skipped += 1
+        else: jobs.append((path, output_path))
+    return jobs, skipped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="vision6D-convert", description="Convert .mesh files to ply and other mesh formats")
+    parser.add_argument("input", help="a .mesh file or a directory searched recursively for .mesh files")
+    parser.add_argument("-o", "--output", default=None, help="output directory, mirrors the input tree (default: next to the inputs)")
+    parser.add_argument("-f", "--format", default="ply", help="output format, ply is written directly, others through trimesh (default: ply)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="convert even if the output is up to date")
+    parser.add_argument("--double", action="store_true", help="write the ply vertices in double precision, float like trimesh otherwise")
+    args = parser.parse_args(argv)
+
+    jobs, skipped = collect_jobs(args.input, args.output, "." + args.format.lower().lstrip("."), args.force)
+    print(f"{len(jobs)} file(s) to convert, {skipped} up to date")
+    if not jobs: return 0
+
+    start = time.perf_counter()
+    converted, nbytes, errors = 0, 0, []
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        # small chunks keep all workers busy when the file sizes vary a lot
+        for size, error in executor.map(convert_file, [job + (args.double,) for job in jobs], chunksize=max(1, len(jobs) // (8 * max(1, args.jobs)))):
+            if error: errors.append(error)
+            else: converted, nbytes = converted + 1, nbytes + size
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    for error in errors: print(f"Failed: {error}", file=sys.stderr)
+    print(f"Converted {converted} file(s), {nbytes / 1e6:.1f} MB in {elapsed:.2f}s: {converted / elapsed:.1f} files/s, {nbytes / 1e6 / elapsed:.1f} MB/s")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
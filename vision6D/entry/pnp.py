@@ -0,0 +1,199 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: pnp.py
+@time: 2026-10-17 23:30
+@desc: batch EPnP over every saved frame of a folder (<folder>/vision6D) or a video (<video>_vision6D) on a process pool
+'''
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import pathlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import PIL.Image
+
+from ..tools import utils
+from ..tools import latlon
+from .. import path
+
+# default intrinsics of ImageStore.add_image
+FX, FY, CX, CY = 18466.768907841793, 19172.02089833029, 954.4324739015676, 538.2131876789998
+
+# set once per worker process by init_worker
+worker = {}
+
+def frame_key(file_path):
+    # folder exports are named {id}.png, video exports {kind}_{frame}.png
+    return re.sub(r"^(mask|render|pose)_", "", pathlib.Path(file_path).stem)
+
+def sort_key(key):
+    return (0, int(key), key) if key.isdigit() else (1, 0, key)
+
+def collect_frames(saved_dir):
+    """(key, mask path, render path, saved pose path or None, model state path or None) of every frame with both a mask and a color render"""
+    saved_dir = pathlib.Path(saved_dir)
+    masks = {frame_key(p): p for p in (saved_dir / "masks").glob("*.png")}
+    renders = {frame_key(p): p for p in (saved_dir / "renders").glob("*.png")}
+    poses = {frame_key(p): p for p in (saved_dir / "poses").glob("*.npy")}
+    # the spacing and the mirroring of the mesh, saved next to each pose by MeshStore.write_model_state
+    states = {frame_key(p): p for p in (saved_dir / "poses").glob("*.json")}
+    keys = sorted(masks.keys() & renders.keys(), key=sort_key)
+    return [(key, masks[key], renders[key], poses.get(key), states.get(key)) for key in keys]
+
+def load_model(mesh_path):
+    """Vertices and faces of the mesh as the mesh store loads it, before the spacing (the pv_mesh points)"""
+    from ..components.mesh_store import MeshStore
+    mesh_data = MeshStore().load_mesh(mesh_path)
+    if mesh_data is None: raise ValueError(f"Cannot load the mesh {mesh_path}")
+    return utils.get_polydata_vertices_faces(mesh_data.pv_mesh)
+
+def load_state(state_path):
+    """Model state of a frame, the command line defaults for the frames saved without one"""
+    state = dict(worker['state'])
+    if state_path is not None:
+        with open(state_path, "r") as f: state.update(json.load(f))
+    return state
+
+def mirror_pose(pose, state, conjugate):
+    # the mirroring of the pnp menu: conjugated for the nocs theme, left multiplied for the latlon theme
+    for mirror, flip in ((state['mirror_x'], np.diag([-1, 1, 1, 1])), (state['mirror_y'], np.diag([1, -1, 1, 1]))):
+        if mirror: pose = flip @ pose @ flip if conjugate else flip @ pose
+    return pose
+
+def init_worker(theme, vertices, faces, grid, state, camera_intrinsics, sampling, max_points, max_error):
+    worker.update(theme=theme, vertices=vertices, faces=faces, grid=grid, state=state, camera_intrinsics=camera_intrinsics, sampling=sampling, max_points=max_points, max_error=max_error)
+
+def solve_frame(job, initial_pose=None):
+    """Solves the pose of one frame, from initial_pose if given, returns (key, pose, statistics dict, error message or None)"""
+    key, mask_path, render_path, pose_path, state_path = job
+    try:
+        state = load_state(state_path)
+        spacing, spacing_offset = np.asarray(state['spacing'], dtype=float), np.asarray(state['spacing_offset'], dtype=float)
+        nocs = worker['theme'] == 'nocs'
+        mask = np.array(PIL.Image.open(mask_path))
+        color_mask = np.array(PIL.Image.open(render_path))[..., :3]
+        if mask.ndim == 3: mask = mask[..., :3].max(axis=2)
+        color_mask = color_mask * (mask > 0)[..., None]
+        if not nocs:
+            if state['mirror_x']: color_mask = color_mask[:, ::-1, :]
+            if state['mirror_y']: color_mask = color_mask[::-1, :, :]
+        binary_mask = utils.color2binary_mask(color_mask)
+        if not np.any(binary_mask): raise ValueError("the masked render is empty")
+
+        if nocs:
+            pts3d, pts2d = utils.create_2d_3d_pairs(color_mask, worker['vertices'] * spacing + spacing_offset, binary_mask)
+            sample = utils.sample_correspondences(pts2d, worker['sampling'], worker['max_points'])
+            pts2d, pts3d = pts2d[sample], pts3d[sample]
+        else:
+            v, u = np.nonzero(binary_mask)
+            pts2d = np.stack((u, v), axis=1)
+            pts2d = pts2d[utils.sample_correspondences(pts2d, worker['sampling'], worker['max_points'])]
+            color = color_mask[pts2d[:, 1], pts2d[:, 0]][..., :2] / 255
+            pts3d = latlon.sample_grid(worker['grid'], worker['vertices'] * spacing + spacing_offset, worker['faces'], color[:, 0], color[:, 1])
+
+        # the nocs solver works in the conjugated frame, initial_pose and pose are the poses of the trajectory
+        if nocs and initial_pose is not None: initial_pose = mirror_pose(initial_pose, state, True)
+        if initial_pose is None: pose, warm_start = utils.solve_epnp_cv2(pts2d, pts3d, worker['camera_intrinsics']), False
+        else: pose, warm_start = utils.solve_pnp_warm_start(pts2d, pts3d, worker['camera_intrinsics'], initial_pose, worker['max_error'])
+        stats = {'frame': key, 'points': len(pts2d), 'warm_start': warm_start, 'reprojection_error': utils.reprojection_error(pose, pts2d, pts3d, worker['camera_intrinsics'])}
+        if nocs: pose = mirror_pose(pose, state, True)
+        if pose_path is not None:
+            # the saved pose is the actor matrix, mirrored the way the pnp menu compares it
+            gt_pose = mirror_pose(np.load(pose_path), state, False)
+            stats['angular_error'] = utils.angler_distance(pose[:3, :3], gt_pose[:3, :3])
+            stats['translation_error'] = np.linalg.norm(pose[:3, 3] - gt_pose[:3, 3])
+        return key, pose, stats, None
+    except Exception as e:
+        return key, np.full((4, 4), np.nan), {'frame': key}, f"{key}: {e}"
+
+def solve_sequence(frames):
+    """Solves consecutive frames in order, every frame is warm started from the pose of the frame before it"""
+    results, initial_pose = [], None
+    for frame in frames:
+        result = solve_frame(frame, initial_pose)
+        initial_pose = result[1] if result[3] is None else None
+        results.append(result)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="vision6D-pnp", description="Solve the pose of every saved frame of a folder or a video with EPnP")
+    parser.add_argument("input", help="the saved folder or video directory (<folder>/vision6D or <video>_vision6D), or the folder or video itself")
+    parser.add_argument("-m", "--mesh", required=True, help="the mesh the frames were annotated with")
+    parser.add_argument("-t", "--theme", choices=("nocs", "latlon"), default="nocs", help="color theme of the saved renders (default: nocs)")
+    parser.add_argument("--spacing", type=float, nargs=3, default=[1e-3, 1e-3, 1e-3], help="spacing of the mesh for the frames saved without a model state (default: 1e-3 1e-3 1e-3)")
+    parser.add_argument("--spacing-offset", type=float, nargs=3, default=[0, 0, 0], help="spacing offset of the mesh for the frames saved without a model state (default: 0 0 0)")
+    parser.add_argument("--mirror-x", action="store_true", help="the mesh is mirrored along x in the frames saved without a model state")
+    parser.add_argument("--mirror-y", action="store_true", help="the mesh is mirrored along y in the frames saved without a model state")
+    parser.add_argument("--intrinsics", default=None, help="3x3 camera intrinsics (.npy or text), the defaults of the image store otherwise")
+    parser.add_argument("-o", "--output", default=None, help="output directory for the trajectory and the statistics (default: the saved directory)")
+    parser.add_argument("-s", "--sequence", action="store_true", help="warm start every frame from the pose of the previous frame, for smooth videos")
+    parser.add_argument("--max-error", type=float, default=2.0, help="median reprojection error (pixels) above which a warm start falls back to RANSAC (default: 2)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    saved_dir = pathlib.Path(args.input)
+    if not (saved_dir / "masks").is_dir():
+        for candidate in (saved_dir / "vision6D", saved_dir.parent / f"{saved_dir.stem}_vision6D"):
+            if (candidate / "masks").is_dir(): saved_dir = candidate
+    frames = collect_frames(saved_dir)
+    print(f"{len(frames)} frame(s) with a mask and a color render in {saved_dir}")
+    if not frames: return 1
+
+    if args.intrinsics is None: camera_intrinsics = np.array([[FX, 0, CX], [0, FY, CY], [0, 0, 1]])
+    elif args.intrinsics.endswith(".npy"): camera_intrinsics = np.load(args.intrinsics)
+    else: camera_intrinsics = np.loadtxt(args.intrinsics)
+    # the PnP menu solves with a square pixel focal length, the one of the view angle
+    camera_intrinsics = camera_intrinsics.astype(np.float64)
+    camera_intrinsics[0, 0] = camera_intrinsics[1, 1]
+
+    vertices, faces = load_model(args.mesh)
+    state = {'spacing': args.spacing, 'spacing_offset': args.spacing_offset, 'mirror_x': args.mirror_x, 'mirror_y': args.mirror_y}
+    grid = None
+    if args.theme == 'latlon':
+        latitude_longitude = utils.load_latitude_longitude()
+        # built (or read from the cache) once here, the workers get the finished grid
+        grid = np.asarray(latlon.load_grid(faces, latitude_longitude[..., 0], latitude_longitude[..., 1]))
+
+    start = time.perf_counter()
+    poses, rows, errors = [], [], []
+    jobs = max(1, args.jobs)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(args.theme, vertices, faces, grid, state, camera_intrinsics, path.PNP_SAMPLING, path.PNP_MAX_POINTS, args.max_error)) as executor:
+        if args.sequence:
+            # one contiguous run of frames per worker, only the first frame of a run is solved from scratch
+            runs = np.array_split(np.arange(len(frames)), min(jobs, len(frames)))
+            results = (result for run in executor.map(solve_sequence, [[frames[i] for i in run] for run in runs]) for result in run)
+        else: results = executor.map(solve_frame, frames, chunksize=max(1, len(frames) // (8 * jobs)))
+        for key, pose, stats, error in results:
+            if error: errors.append(error)
+            poses.append(pose)
+            rows.append(stats)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    output_dir = pathlib.Path(args.output) if args.output else saved_dir
+    os.makedirs(output_dir, exist_ok=True)
+    # one (N, 4, 4) trajectory in frame order, the frames that failed are nan
+    np.savez(output_dir / "pnp_trajectory.npz", frames=np.array([frame[0] for frame in frames]), poses=np.stack(poses))
+    fields = ['frame', 'points', 'warm_start', 'reprojection_error', 'angular_error', 'translation_error']
+    with open(output_dir / "pnp_statistics.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for error in errors: print(f"Failed: {error}", file=sys.stderr)
+    solved = [row for row in rows if 'angular_error' in row]
+    if solved: print(f"Mean angular error {np.mean([row['angular_error'] for row in solved]):.4f} deg, mean translation error {np.mean([row['translation_error'] for row in solved]):.4f}")
+    print(f"Solved {len(frames) - len(errors)} frame(s) in {elapsed:.2f}s: {(len(frames) - len(errors)) / elapsed:.1f} frames/s, written to {output_dir}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -27,7 +27,9 @@ from PyQt5.QtCore import Qt, QPoint, pyqtSignal
 from ..widgets import CustomQtInteractor
 from ..widgets import PopUpDialog
 from ..widgets import SearchBar
+from ..widgets import ExportWorker
 
+from ..components import RenderStore
 from ..components import ImageStore
 from ..components import MaskStore
 from ..components import BboxStore
@@ -195,17 +197,24 @@ class MyMainWindow(MainWindow):
 
         # set up the camera props
         # self.image_store.set_camera_props()
+
+        # renders and pngs are written in the background, the results are reported in the output panel
+        self.export_worker = ExportWorker(self)
+        self.export_worker.exported.connect(self.output_text.append)
+        self.export_worker.failed.connect(utils.display_warning)
         
         self.image_container = ImageContainer(plotter=self.plotter, 
                                             hintLabel=self.hintLabel,
                                             track_actors_names=self.track_actors_names, 
                                             add_button_actor_name=self.add_button_actor_name,
+                                            export_worker=self.export_worker,
                                             output_text=self.output_text)
         
         self.mask_container = MaskContainer(plotter=self.plotter,
                                             hintLabel=self.hintLabel,
                                             track_actors_names=self.track_actors_names, 
                                             add_button_actor_name=self.add_button_actor_name,
+                                            export_worker=self.export_worker,
                                             output_text=self.output_text)
          
         self.mesh_container = MeshContainer(plotter=self.plotter,
@@ -217,10 +226,10 @@ class MyMainWindow(MainWindow):
                                             reset_camera=self.image_store.reset_camera,
                                             toggle_register=self.toggle_register,
                                             load_mask = self.mask_container.load_mask,
+                                            export_worker=self.export_worker,
                                             output_text=self.output_text)
         
         self.pnp_container = PnPContainer(plotter=self.plotter,
-                                        export_mesh_render=self.mesh_container.export_mesh_render,
                                         output_text=self.output_text)
         
         self.video_container = VideoContainer(plotter=self.plotter,
@@ -231,6 +240,7 @@ class MyMainWindow(MainWindow):
                                             add_image=self.image_container.add_image,
                                             load_mask=self.mask_container.load_mask,
                                             clear_plot=self.clear_plot,
+                                            export_worker=self.export_worker,
                                             output_text=self.output_text)
         
         self.folder_container = FolderContainer(plotter=self.plotter,
@@ -238,6 +248,7 @@ class MyMainWindow(MainWindow):
                                                 toggle_register=self.toggle_register,
                                                 add_folder=self.add_folder,
                                                 load_mask=self.mask_container.load_mask,
+                                                export_worker=self.export_worker,
                                                 output_text=self.output_text)
         
         self.bbox_container = BboxContainer(plotter=self.plotter,
@@ -340,6 +351,7 @@ class MyMainWindow(MainWindow):
         exportMenu.addAction('Mask', self.mask_container.export_mask)
         exportMenu.addAction('Bbox', self.bbox_container.export_bbox)
         exportMenu.addAction('Mesh/Pose', self.mesh_container.export_mesh_pose)
+        exportMenu.addAction('Meshes', self.mesh_container.export_meshes)
         exportMenu.addAction('Mesh Render', self.mesh_container.export_mesh_render)
         exportMenu.addAction('SegMesh Render', self.mesh_container.export_segmesh_render)
         exportMenu.addAction('Camera Info', self.image_container.export_camera_info)
@@ -700,8 +712,11 @@ class MyMainWindow(MainWindow):
                 verts, _ = utils.get_mesh_actor_vertices_faces(mesh_data.actor)
                 mesh_data.undo_vertices.append(verts)
                 mesh_data.undo_vertices = mesh_data.undo_vertices[-20:]
-                vertices = utils.transform_vertices(verts, mesh_data.actor.user_matrix)
-                mesh_data.pv_mesh.points = vertices
+                # bake the pose into the vertices, the spacing stays a transform on the actor
+                spacing_matrix = self.mesh_store.get_spacing_matrix(mesh_data)
+                transformation_matrix = np.linalg.inv(spacing_matrix) @ mesh_data.actor.user_matrix @ spacing_matrix
+                vertices = utils.transform_vertices(verts, transformation_matrix)
+                self.mesh_store.update_vertices(mesh_data, vertices, transformation_matrix)
                 mesh_data.actor.user_matrix = np.eye(4)
                 mesh_data.initial_pose = np.eye(4) # if meshes are not anchored, then there the initial pose will always be np.eye(4)
 
@@ -826,11 +841,9 @@ class MyMainWindow(MainWindow):
             if 'mask_path' in workspace and workspace['mask_path'] is not None: self.mask_container.add_mask_file(mask_path=root / pathlib.Path(*workspace['mask_path'].split("\\")))
             if 'bbox_path' in workspace and workspace['bbox_path'] is not None: self.bbox_container.add_bbox_file(bbox_path=root / pathlib.Path(*workspace['bbox_path'].split("\\")))
             if 'mesh_path' in workspace:
-                meshes = workspace['mesh_path']
-                for item in meshes: 
-                    mesh_path, pose = meshes[item]
-                    self.mesh_container.add_mesh_file(mesh_path=root / pathlib.Path(*mesh_path.split("\\")))
-                    self.mesh_container.add_pose_file(pose)
+                meshes = workspace['mesh_path'].values()
+                mesh_paths = [root / pathlib.Path(*mesh_path.split("\\")) for mesh_path, _ in meshes]
+                self.mesh_container.add_mesh_files(mesh_paths, poses=[pose for _, pose in meshes])
             self.image_store.reset_camera()
 
     def export_workspace(self):
@@ -856,7 +869,7 @@ class MyMainWindow(MainWindow):
                 if mask_path: self.mask_container.add_mask_file(mask_path=mask_path)
                 if mesh_path: 
                     with open(mesh_path, 'r') as f: mesh_path = f.read().splitlines()
-                    for path in mesh_path: self.mesh_container.add_mesh_file(path)
+                    self.mesh_container.add_mesh_files(mesh_path)
                 if pose_path: self.mesh_container.add_pose_file(pose_path=pose_path)
                 self.anchor_button.setCheckable(False)
                 self.anchor_button.setEnabled(False)
@@ -941,6 +954,8 @@ class MyMainWindow(MainWindow):
             button.deleteLater()
 
         self.mesh_store.reset()
+        # the off-screen contexts, the resident actor copies and the cached renders of the cleared scene
+        RenderStore().reset()
         self.video_store.reset()
         self.folder_store.reset()
         self.workspace_path = ''
@@ -6,6 +6,15 @@ PKG_ROOT = pathlib.Path(os.path.abspath(__file__)).parent # vision6D
 LATLON_PATH = PKG_ROOT / "data" / "ossiclesCoordinateMapping2.json"
 ICON_PATH = PKG_ROOT / "data" / "icons"
 MODEL_PATH = PKG_ROOT / "data" / "model"
+# Parsed meshes are cached here, can be moved with the VISION6D_CACHE environment variable
+CACHE_PATH = pathlib.Path(os.environ.get("VISION6D_CACHE", pathlib.Path.home() / ".cache" / "vision6D"))
+# Off-screen renders go through vtk (OpenGL) by default, VISION6D_RENDER_BACKEND=numpy rasterizes the meshes and masks on the CPU
+RENDER_BACKEND = os.environ.get("VISION6D_RENDER_BACKEND", "vtk").lower()
+# EPnP is solved on at most PNP_MAX_POINTS correspondences picked by PNP_SAMPLING ('grid', 'random', 'stride' or 'all')
+PNP_SAMPLING = os.environ.get("VISION6D_PNP_SAMPLING", "grid").lower()
+PNP_MAX_POINTS = int(os.environ.get("VISION6D_PNP_MAX_POINTS", 5000))
 
 # Global variables, make sure it is (width, height), just to be consistent with the vtk plotter
-PLOT_SIZE = (1920, 1080)
\ No newline at end of file
+PLOT_SIZE = (1920, 1080)
+# Interactive previews are rendered with at most this many pixels, exports and PnP use the full image size
+PREVIEW_PIXELS = 1280 * 720
@@ -1,2 +1,4 @@
 from . import utils
-from . import exception
\ No newline at end of file
+from . import exception
+from . import mesh_cache
+from . import rasterizer
@@ -0,0 +1,222 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: latlon.py
+@time: 2026-10-17 22:10
+@desc: batched inverse of the lat/lon parameterization of a mesh, the vectorized utils.latLon2xyz
+'''
+
+import os
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from easydict import EasyDict
+
+from ..path import CACHE_PATH
+
+logger = logging.getLogger("vision6D")
+
+# (query, face) pairs solved at once, bounds the memory of a batch
+CHUNK_SIZE = 1 << 20
+# nodes per axis of the (lat, lon) -> xyz grid over [0, 1], the nodes fall on the 8 bit colors of a latlon mask
+GRID_SIZE = 256
+
+def build_index(faces, lat, lonf, msk):
+    """Uniform grid over the lat/lon bounds of the faces selected by msk, every cell lists the faces overlapping it
+
+    lat is the latitude of the vertices, lonf the longitude of the face corners (len(faces), 3). In a cell the faces
+    are in ascending order, the order latLon2xyz visits them in.
+    """
+    lat_f = lat[faces]
+    low = np.stack((lat_f.min(axis=1), lonf.min(axis=1)), axis=1)
+    high = np.stack((lat_f.max(axis=1), lonf.max(axis=1)), axis=1)
+    candidates = np.flatnonzero(msk)
+    index = EasyDict(faces=faces, lat=lat, lonf=lonf, low=low, high=high, cells=max(1, int(np.sqrt(len(candidates)))))
+    if len(candidates) == 0:
+        index.update(origin=np.zeros(2), cell_size=np.ones(2), cell_faces=candidates, start=np.zeros(2, dtype=np.int64))
+        return index
+    index.origin = low[candidates].min(axis=0)
+    extent = high[candidates].max(axis=0) - index.origin
+    index.cell_size = np.where(extent > 0, extent / index.cells, 1)
+
+    # one entry per face and overlapped cell, the cells of the bounds are monotonic so a covered query is always listed
+    c0, c1 = get_cell(index, low[candidates]), get_cell(index, high[candidates])
+    rows, cols = c1[:, 0] - c0[:, 0] + 1, c1[:, 1] - c0[:, 1] + 1
+    counts = rows * cols
+    entry = np.repeat(np.arange(len(candidates)), counts)
+    local = np.arange(len(entry)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell = (c0[entry, 0] + local // cols[entry]) * index.cells + c0[entry, 1] + local % cols[entry]
+    order = np.argsort(cell, kind='stable')
+    index.cell_faces = candidates[entry[order]]
+    index.start = np.searchsorted(cell[order], np.arange(index.cells * index.cells + 1))
+    return index
+
+def get_cell(index, points):
+    return np.clip(np.floor((points - index.origin) / index.cell_size), 0, index.cells - 1).astype(np.int64)
+
+def latlon_to_xyz(vertices, index, gx, gy):
+    """The mesh points at the lat/lon coordinates (gx, gy), the same points latLon2xyz returns one query at a time"""
+    return barycentric_points(vertices, index.faces, *latlon_to_barycentric(index, gx, gy))
+
+def barycentric_points(vertices, faces, face, weights):
+    """Mesh points of the faces at the barycentric weights (n, 3), nan where face is -1"""
+    if len(faces) == 0: return np.full((len(face), 3), np.nan)
+    f = faces[np.maximum(face, 0)]
+    points = np.einsum('ni,nij->nj', weights, vertices[f])
+    points[face < 0] = np.nan
+    return points
+
+def latlon_to_barycentric(index, gx, gy):
+    """Face and barycentric weights (n, 3) of the mesh points at the lat/lon coordinates (gx, gy)
+
+    A query takes the closest point of the indexed faces whose bounds contain it, inside a face or on its edges, and
+    the face with the nearest corner (over all the faces) when none does. Only the faces and the lat/lon enter, the
+    points follow any change of the vertices. The face is -1 (and the weights nan) on a mesh without faces.
+    """
+    if len(index.faces) == 0: return np.full(len(gx), -1), np.full((len(gx), 3), np.nan)
+    # the colors of a mask are quantized, the same coordinates come back many times
+    queries, inverse = np.unique(np.stack((gx, gy), axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    cell = get_cell(index, queries)
+    cell = cell[:, 0] * index.cells + cell[:, 1]
+    counts = index.start[cell + 1] - index.start[cell]
+    ends = np.cumsum(counts)
+
+    faces, weights = np.empty(len(queries), dtype=np.int64), np.empty((len(queries), 3))
+    start = 0
+    while start < len(queries):
+        base = ends[start - 1] if start else 0
+        stop = max(int(np.searchsorted(ends, base + CHUNK_SIZE, side='right')), start + 1)
+        query = np.repeat(np.arange(start, stop), counts[start:stop])
+        face = index.cell_faces[index.start[cell[query]] + np.arange(len(query)) - np.repeat(ends[start:stop] - counts[start:stop] - base, counts[start:stop])]
+        g = queries[query]
+        covered = np.all((index.low[face] <= g) & (g <= index.high[face]), axis=1)
+        query, face = query[covered], face[covered]
+        # the queries outside every face fall back to the face of the nearest corner
+        missing = np.setdiff1d(np.arange(start, stop), query)
+        if len(missing):
+            query = np.concatenate((query, missing))
+            face = np.concatenate((face, nearest_faces(index, queries[missing])))
+            order = np.argsort(query, kind='stable')
+            query, face = query[order], face[order]
+        weight, distance = solve_faces(index, face, queries[query])
+        closest = select_closest(query, distance)
+        faces[query[closest]], weights[query[closest]] = face[closest], weight[closest]
+        start = stop
+    return faces[inverse], weights[inverse]
+
+def nearest_faces(index, queries):
+    lat_f = index.lat[index.faces]
+    if len(lat_f) == 0: return np.full(len(queries), -1)
+    faces = np.empty(len(queries), dtype=np.int64)
+    step = max(1, CHUNK_SIZE // (3 * len(lat_f)))
+    for i in range(0, len(queries), step):
+        gx, gy = queries[i:i + step, 0, None, None], queries[i:i + step, 1, None, None]
+        faces[i:i + step] = np.argmin(np.min((lat_f - gx) * (lat_f - gx) + (index.lonf - gy) * (index.lonf - gy), axis=2), axis=1)
+    return faces
+
+def solve_faces(index, face, g):
+    """Closest point of every face to its query g in the lat/lon plane, as barycentric weights and a squared lat/lon distance"""
+    f = index.faces[face]
+    lat, lonf = index.lat, index.lonf
+    p0 = np.stack((lat[f[:, 0]], lonf[face, 0]), axis=1)
+    p1 = np.stack((lat[f[:, 1]], lonf[face, 1]), axis=1)
+    V = np.empty((len(face), 2, 2))
+    V[:, 0, 0], V[:, 0, 1] = lat[f[:, 1]] - lat[f[:, 0]], lat[f[:, 2]] - lat[f[:, 0]]
+    V[:, 1, 0], V[:, 1, 1] = lonf[face, 1] - lonf[face, 0], lonf[face, 2] - lonf[face, 0]
+    ab = (np.linalg.pinv(V) @ (g - p0)[..., None])[..., 0]
+    a, b = ab[:, 0], ab[:, 1]
+
+    # inside the face: the barycentric point
+    inside = (a >= 0) & (b >= 0) & (a + b <= 1)
+    weight = np.stack((1 - a - b, a, b), axis=1)
+    distance = np.sum((p0 + (V @ ab[..., None])[..., 0] - g) ** 2, axis=1)
+
+    # outside: the closest of the points projected on the three edges
+    outside = np.flatnonzero(~inside)
+    e0, e1 = V[outside, :, 0], V[outside, :, 1]
+    e2 = np.stack((lat[f[outside, 2]] - lat[f[outside, 1]], lonf[face[outside], 2] - lonf[face[outside], 1]), axis=1)
+    r0, r1 = g[outside] - p0[outside], g[outside] - p1[outside]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = np.clip(np.sum(e0 * r0, axis=1) / np.linalg.norm(e0, axis=1) ** 2, 0, 1)
+        d = np.clip(np.sum(e1 * r0, axis=1) / np.linalg.norm(e1, axis=1) ** 2, 0, 1)
+        e = np.clip(np.sum(e2 * r1, axis=1) / np.linalg.norm(e2, axis=1) ** 2, 0, 1)
+    d1 = np.sum((c[:, None] * e0 + p0[outside] - g[outside]) ** 2, axis=1)
+    d2 = np.sum((d[:, None] * e1 + p0[outside] - g[outside]) ** 2, axis=1)
+    d3 = np.sum((e[:, None] * e2 + p1[outside] - g[outside]) ** 2, axis=1)
+    # the comparisons of latLon2xyz, a nan distance (degenerate edge) is never the strict minimum
+    edge1 = (d1 < d2) & (d1 < d3)
+    edge2 = ~edge1 & (d2 < d3)
+    zero = np.zeros_like(c)
+    weight[outside] = np.where(edge1[:, None], np.stack((1 - c, c, zero), axis=1),
+                               np.where(edge2[:, None], np.stack((1 - d, zero, d), axis=1), np.stack((zero, 1 - e, e), axis=1)))
+    distance[outside] = np.where(edge1, d1, np.where(edge2, d2, d3))
+    return weight, distance
+
+def select_closest(query, distance):
+    """Index of the solution kept for every query of the sorted query, the min reduction of latLon2xyz
+
+    The reduction keeps the current solution while it is <= the next one, so the first of the smallest distances
+    wins, and a nan distance replaces it and is then replaced by the solution after it.
+    """
+    position = np.arange(len(query))
+    last_nan = np.full(query[-1] + 1, -1)
+    nan = np.isnan(distance)
+    np.maximum.at(last_nan, query[nan], position[nan])
+    last = np.append(query[1:] != query[:-1], True)
+    # a query ending on a nan keeps that solution, the others only compete after their last nan
+    eligible = (position > last_nan[query]) | (nan & last & (position == last_nan[query]))
+    order = np.lexsort((position, np.where(nan, -np.inf, distance), query))
+    order = order[eligible[order]]
+    return order[np.unique(query[order], return_index=True)[1]]
+
+def grid_file(faces, lat, lon):
+    """Cache entry of the lookup grid, keyed by the faces and the parameterization it is built from"""
+    key = hashlib.sha1(b"barycentric")
+    for array in (faces, lat, lon): key.update(np.ascontiguousarray(array).tobytes())
+    key.update(str(GRID_SIZE).encode("utf-8"))
+    return CACHE_PATH / "latlon" / f"{key.hexdigest()}.npy"
+
+def build_grid(faces, lat, lon):
+    """Solves every grid node, (GRID_SIZE, GRID_SIZE, 4) indexed by (lat, lon): the face and its 3 barycentric weights"""
+    lonf = lon[faces]
+    msk = (np.sum(lonf >= 0, axis=1) == 3) & (np.sum(lat[faces] >= 0, axis=1) == 3)
+    index = build_index(faces, lat, lonf, msk)
+    gx, gy = np.meshgrid(np.arange(GRID_SIZE) / (GRID_SIZE - 1), np.arange(GRID_SIZE) / (GRID_SIZE - 1), indexing='ij')
+    face, weights = latlon_to_barycentric(index, gx.reshape(-1), gy.reshape(-1))
+    return np.concatenate((face[:, None], weights), axis=1).reshape((GRID_SIZE, GRID_SIZE, 4))
+
+def load_grid(faces, lat, lon):
+    """The lookup grid of the mesh, built once and then memory-mapped from the cache
+
+    The grid does not depend on the vertices, the spacing and the poses baked into them never rebuild it.
+    """
+    path = grid_file(faces, lat, lon)
+    if path.is_file():
+        try: return np.load(path, mmap_mode='r')
+        except (OSError, ValueError): pass
+    grid = build_grid(faces, lat, lon)
+    try:
+        os.makedirs(path.parent, exist_ok=True)
+        # write to a temporary file first so a half written entry is never picked up
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f: np.save(f, grid)
+        os.replace(tmp_path, path)
+    except OSError as e: logger.warning(f"Cannot write the latlon grid cache {path}: {e}")
+    return grid
+
+def sample_grid(grid, vertices, faces, gx, gy):
+    """Mesh points (of the current vertices) of the grid nodes nearest to (gx, gy) in [0, 1]
+
+    The 8 bit colors of a mask fall on the nodes. Off the nodes there is no interpolation, the points of neighboring
+    nodes can be on either side of the longitude seam or around a pole and their mean is not on the mesh.
+    """
+    size = len(grid)
+    i = np.rint(np.clip(gx, 0, 1) * (size - 1)).astype(np.int64)
+    j = np.rint(np.clip(gy, 0, 1) * (size - 1)).astype(np.int64)
+    node = np.asarray(grid[i, j])
+    return barycentric_points(np.asarray(vertices, dtype=np.float64), np.asarray(faces), node[:, 0].astype(np.int64), node[:, 1:])
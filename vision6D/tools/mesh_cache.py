@@ -0,0 +1,144 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: mesh_cache.py
+@time: 2026-10-17 09:12
+@desc: persistent on-disk cache for parsed meshes, keyed by path, size and mtime
+'''
+
+import os
+import hashlib
+import logging
+import pathlib
+import threading
+
+import numpy as np
+import trimesh
+
+from . import utils
+from ..path import CACHE_PATH
+
+logger = logging.getLogger("vision6D")
+
+CACHE_MAGIC = b"V6DM"
+CACHE_VERSION = 2
+
+"""
+Layout of a cache entry (little endian):
+    header      HEADER_SIZE bytes, see HEADER_DTYPE
+    vertices    float64, numverts x 3
+    faces       int64,   numfaces x 3
+    nocs        uint8,   numverts x 3
+The arrays are memory-mapped on a cache hit, so nothing has to be parsed.
+"""
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("numverts", "<u8"),
+    ("numfaces", "<u8"),
+    ("centroid", "<f8", (3,)),
+    ("bounds", "<f8", (2, 3)),
+    # header of the original .mesh file, so it can be written back without re-reading it
+    ("has_meshobj", "u1"),
+    ("id", "<i4", (1,)),
+    ("orient", "<i4", (3,)),
+    ("dim", "<i4", (3,)),
+    ("sz", "<f4", (3,)),
+    ("color", "<i4", (3,)),
+])
+HEADER_SIZE = 256
+MESHOBJ_KEYS = ('id', 'orient', 'dim', 'sz', 'color')
+
+def cache_file(mesh_path):
+    """Returns the cache entry path for mesh_path, or None if the mesh cannot be stat'ed"""
+    mesh_path = pathlib.Path(mesh_path).resolve()
+    try: stat = os.stat(mesh_path)
+    except OSError: return None
+    key = hashlib.sha1(f"{mesh_path}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+    return CACHE_PATH / "meshes" / f"{key}.bin"
+
+def load_mesh(mesh_path):
+    """Opens the cached trimesh for mesh_path, returns None on a cache miss
+
+    Vertices, faces and the derived metadata (centroid, bounds, nocs colors) are copy-on-write
+    memory maps of the cache entry.
+    """
+    path = cache_file(mesh_path)
+    if path is None or not path.is_file(): return None
+
+    header = np.fromfile(path, HEADER_DTYPE, 1)
+    if len(header) != 1 or header["magic"][0] != CACHE_MAGIC or header["version"][0] != CACHE_VERSION: return None
+    header = header[0]
+    numverts, numfaces = int(header["numverts"]), int(header["numfaces"])
+    if path.stat().st_size != HEADER_SIZE + numverts * 3 * (8 + 1) + numfaces * 3 * 8: return None
+
+    offset = HEADER_SIZE
+    vertices = np.memmap(path, "<f8", mode="c", offset=offset, shape=(numverts, 3)) if numverts else np.empty((0, 3))
+    offset += numverts * 3 * 8
+    faces = np.memmap(path, "<i8", mode="c", offset=offset, shape=(numfaces, 3)) if numfaces else np.empty((0, 3), dtype=np.int64)
+    offset += numfaces * 3 * 8
+    nocs = np.memmap(path, "u1", mode="c", offset=offset, shape=(numverts, 3)) if numverts else np.empty((0, 3), dtype=np.uint8)
+
+    mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+    mesh.metadata["centroid"] = header["centroid"].copy()
+    mesh.metadata["bounds"] = header["bounds"].copy()
+    mesh.metadata["nocs"] = nocs
+    if header["has_meshobj"]: mesh.metadata.update({key: header[key].copy() for key in MESHOBJ_KEYS})
+    return mesh
+
+def save_mesh(mesh_path, mesh):
+    """Writes mesh (a trimesh.Trimesh parsed from mesh_path) into the cache with a single write
+
+    The centroid, bounds and nocs colors are computed here and stored with the geometry, they are
+    also added to mesh.metadata. Failing to write the cache is not fatal.
+    """
+    path = cache_file(mesh_path)
+    if path is None: return
+
+    vertices = np.ascontiguousarray(mesh.vertices, dtype="<f8")
+    faces = np.ascontiguousarray(mesh.faces, dtype="<i8")
+    numverts, numfaces = len(vertices), len(faces)
+
+    if numverts:
+        bounds = np.stack((vertices.min(axis=0), vertices.max(axis=0)))
+        centroid = vertices.mean(axis=0)
+        nocs = utils.color_mesh_nocs(vertices)
+    else:
+        bounds = np.zeros((2, 3))
+        centroid = np.zeros(3)
+        nocs = np.empty((0, 3), dtype=np.uint8)
+
+    mesh.metadata["centroid"] = centroid
+    mesh.metadata["bounds"] = bounds
+    mesh.metadata["nocs"] = nocs
+
+    # build the whole entry in one preallocated buffer
+    buffer = np.zeros(HEADER_SIZE + numverts * 3 * (8 + 1) + numfaces * 3 * 8, dtype=np.uint8)
+    header = buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+    header["magic"] = CACHE_MAGIC
+    header["version"] = CACHE_VERSION
+    header["numverts"] = numverts
+    header["numfaces"] = numfaces
+    header["centroid"] = centroid
+    header["bounds"] = bounds
+    if all(key in mesh.metadata for key in MESHOBJ_KEYS):
+        header["has_meshobj"] = 1
+        for key in MESHOBJ_KEYS: header[key] = mesh.metadata[key]
+
+    offset = HEADER_SIZE
+    buffer[offset:offset + vertices.nbytes] = vertices.reshape(-1).view(np.uint8)
+    offset += vertices.nbytes
+    buffer[offset:offset + faces.nbytes] = faces.reshape(-1).view(np.uint8)
+    offset += faces.nbytes
+    buffer[offset:offset + nocs.nbytes] = nocs.reshape(-1)
+
+    try:
+        os.makedirs(path.parent, exist_ok=True)
+        # write to a temporary file first so a half written entry is never picked up
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f: f.write(buffer)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Cannot write the mesh cache {path}: {e}")
@@ -0,0 +1,167 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: rasterizer.py
+@time: 2026-10-17 19:20
+@desc: z-buffered triangle rasterizer in numpy, renders the mesh and mask actors without an OpenGL context
+'''
+
+import functools
+
+import numpy as np
+import pyvista as pv
+from easydict import EasyDict
+import vtk.util.numpy_support as vtknp
+
+from . import utils
+
+# candidate pixels tested at once, bounds the memory of a rasterization pass
+CHUNK_SIZE = 1 << 20
+
+def rasterize(clip, faces, width, height):
+    """Rasterizes the triangles faces of the clip space vertices clip (n, 4) with a z-buffer
+
+    Returns the visible face of every pixel (-1 on the background), the perspective correct barycentric
+    weights of the pixel centers in that face and 1 / w of the visible surface (0 on the background).
+    The image rows go down from the top, like the screenshots of the vtk renders.
+    """
+    inv_w_buffer = np.zeros(height * width)
+    face_buffer = np.full(height * width, -1, dtype=np.int64)
+    weights = np.zeros((height, width, 3), dtype=np.float32)
+
+    # triangles with a vertex behind the camera are not clipped, they are dropped
+    w = clip[:, 3]
+    in_front = np.flatnonzero(np.all(w[faces] > 1e-12, axis=1))
+    faces = faces[in_front]
+    if len(faces) == 0: return face_buffer.reshape((height, width)), weights, inv_w_buffer.reshape((height, width))
+    inv_w = 1 / w
+    x = (clip[:, 0] * inv_w + 1) * (width / 2)
+    y = (1 - clip[:, 1] * inv_w) * (height / 2)
+
+    tx, ty, tw = x[faces], y[faces], inv_w[faces]
+    area = (tx[:, 1] - tx[:, 0]) * (ty[:, 2] - ty[:, 0]) - (tx[:, 2] - tx[:, 0]) * (ty[:, 1] - ty[:, 0])
+    # pixel i is covered when its center i + .5 is inside the triangle
+    y0 = np.maximum(np.ceil(ty.min(axis=1) - 0.5), 0).astype(np.int64)
+    y1 = np.minimum(np.floor(ty.max(axis=1) - 0.5), height - 1).astype(np.int64)
+    keep = np.flatnonzero((y1 >= y0) & (tx.max(axis=1) >= 0.5) & (tx.min(axis=1) <= width - 0.5) & (np.abs(area) > 1e-12))
+    # one span per triangle and pixel row, between the crossings of the edges with the row center
+    rows = y1[keep] - y0[keep] + 1
+    span_face = np.repeat(keep, rows)
+    span_y = y0[span_face] + np.arange(len(span_face)) - np.repeat(np.cumsum(rows) - rows, rows)
+    span_x0, span_x1 = np.full(len(span_face), np.inf), np.full(len(span_face), -np.inf)
+    center = span_y + 0.5
+    for a, b in ((0, 1), (1, 2), (2, 0)):
+        xa, ya, xb, yb = tx[span_face, a], ty[span_face, a], tx[span_face, b], ty[span_face, b]
+        crossing = ((ya - center) * (yb - center) <= 0) & (ya != yb)
+        with np.errstate(divide='ignore', invalid='ignore'): xc = xa + (center - ya) * (xb - xa) / (yb - ya)
+        span_x0 = np.where(crossing, np.minimum(span_x0, xc), span_x0)
+        span_x1 = np.where(crossing, np.maximum(span_x1, xc), span_x1)
+    span_x0 = np.maximum(np.ceil(span_x0 - 0.5), 0)
+    span_x1 = np.minimum(np.floor(span_x1 - 0.5), width - 1)
+    spans = np.flatnonzero(span_x1 >= span_x0)
+    span_face, span_y, span_x0 = span_face[spans], span_y[spans], span_x0[spans].astype(np.int64)
+    counts = span_x1[spans].astype(np.int64) - span_x0 + 1
+    ends = np.cumsum(counts)
+
+    start = 0
+    while start < len(counts):
+        base = ends[start - 1] if start else 0
+        stop = max(int(np.searchsorted(ends, base + CHUNK_SIZE, side='right')), start + 1)
+        # every pixel of the spans start:stop
+        chunk = np.repeat(np.arange(start, stop), counts[start:stop])
+        px = span_x0[chunk] + np.arange(len(chunk)) - np.repeat(ends[start:stop] - counts[start:stop] - base, counts[start:stop])
+        py = span_y[chunk]
+        t = span_face[chunk]
+        b0, b1, b2 = barycentrics(tx[t], ty[t], area[t], px + 0.5, py + 0.5)
+        # the spans are exact up to rounding, the pixel centers are tested again
+        inside = (b0 >= 0) & (b1 >= 0) & (b2 >= 0)
+        t, pixel = t[inside], (py * width + px)[inside]
+        # 1 / w is affine in screen space, the largest one is the closest surface
+        z = b0[inside] * tw[t, 0] + b1[inside] * tw[t, 1] + b2[inside] * tw[t, 2]
+        np.maximum.at(inv_w_buffer, pixel, z)
+        nearest = z == inv_w_buffer[pixel]
+        face_buffer[pixel[nearest]] = t[nearest]
+        start = stop
+
+    # perspective correct weights of the visible faces
+    pixel = np.flatnonzero(face_buffer >= 0)
+    t = face_buffer[pixel]
+    py, px = np.divmod(pixel, width)
+    b = np.stack(barycentrics(tx[t], ty[t], area[t], px + 0.5, py + 0.5), axis=1) * tw[t]
+    weights.reshape((-1, 3))[pixel] = b / b.sum(axis=1, keepdims=True)
+    # back to the indices of the input faces
+    face_buffer[pixel] = in_front[t]
+    return face_buffer.reshape((height, width)), weights, inv_w_buffer.reshape((height, width))
+
+def barycentrics(tx, ty, area, px, py):
+    b0 = ((tx[:, 1] - px) * (ty[:, 2] - py) - (tx[:, 2] - px) * (ty[:, 1] - py)) / area
+    b1 = ((tx[:, 2] - px) * (ty[:, 0] - py) - (tx[:, 0] - px) * (ty[:, 2] - py)) / area
+    return b0, b1, 1 - b0 - b1
+
+def actor_colors(actor, num_points):
+    """Per vertex rgb of the actor in [0, 1] as its mapper colors them, None if it has a single color"""
+    mapper = actor.GetMapper()
+    if not mapper.GetScalarVisibility(): return None
+    # MapScalars follows the scalar mode, the selected array and the lookup table of the mapper
+    colors = mapper.MapScalars(mapper.GetInput(), 1.0)
+    if colors is None or colors.GetNumberOfTuples() != num_points: return None
+    return vtknp.vtk_to_numpy(colors)[:, :3] / 255
+
+def render_actors(actors, camera, size, matrices=None):
+    """Renders the {name: actor} pairs at size (width, height) with a perspective camera
+
+    Returns the color, depth and instance buffers of RenderStore.render_buffers. The surfaces are lit by
+    a headlight with the ambient and diffuse terms of the actor properties, the edges are not anti-aliased.
+    matrices replaces the world matrices of the actors, in the same order.
+    """
+    return snapshot_actors(actors, camera, size, matrices)()
+
+def snapshot_actors(actors, camera, size, matrices=None):
+    """Copies what render_actors needs out of the actors and the camera, returns a function rendering that copy
+
+    Only the copy is touched by the returned function, so it can run on any thread while the actors keep changing.
+    """
+    width, height = int(size[0]), int(size[1])
+    projection = pv.array_from_vtkmatrix(camera.GetCompositeProjectionTransformMatrix(width / height, -1, 1))
+    headlight = np.array(camera.GetDirectionOfProjection())
+
+    parts = []
+    if matrices is None: matrices = [pv.array_from_vtkmatrix(actor.GetMatrix()) for actor in actors.values()]
+    for actor, matrix in zip(actors.values(), matrices):
+        vertices, faces = utils.get_polydata_vertices_faces(actor.GetMapper().GetInput())
+        prop = actor.GetProperty()
+        parts.append(EasyDict(world=utils.transform_vertices(vertices, matrix), faces=np.array(faces), colors=actor_colors(actor, len(vertices)),
+                              color=prop.GetColor(), lighting=prop.GetLighting(), ambient=prop.GetAmbient(), diffuse=prop.GetDiffuse()))
+    return functools.partial(render_parts, parts, projection, headlight, width, height)
+
+def render_parts(parts, projection, headlight, width, height):
+    offsets = np.cumsum([0] + [len(part.world) for part in parts[:-1]])
+    world = np.vstack([part.world for part in parts])
+    faces = np.vstack([part.faces + offset for part, offset in zip(parts, offsets)])
+    face, weights, inv_w = rasterize(np.hstack((world, np.ones((len(world), 1)))) @ projection.T, faces, width, height)
+
+    color = np.zeros((height, width, 3))
+    instance = np.zeros((height, width), dtype=np.uint16)
+    start = 0
+    for i, part in enumerate(parts):
+        pixels = (face >= start) & (face < start + len(part.faces))
+        visible = face[pixels] - start
+        start += len(part.faces)
+        if len(visible) == 0: continue
+        instance[pixels] = i + 1
+        if part.colors is None: rgb = np.broadcast_to(part.color, (len(visible), 3))
+        else: rgb = np.einsum('ki,kij->kj', weights[pixels], part.colors[part.faces[visible]])
+        if part.lighting:
+            # flat shading with the face normals, lit from both sides like vtk does
+            triangles = part.world[part.faces[visible]]
+            normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+            normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-30)
+            shade = np.minimum(part.ambient + part.diffuse * np.abs(normals @ headlight), 1)
+            rgb = rgb * shade[:, None]
+        color[pixels] = rgb
+
+    depth = np.full((height, width), np.nan)
+    np.divide(1, inv_w, out=depth, where=face >= 0)
+    return EasyDict(color=np.round(color * 255).astype(np.uint8), depth=depth, instance=instance)
@@ -10,9 +10,9 @@
 
 import __future__
 import os
-import copy
 import json
 import logging
+import functools
 import pathlib
 
 import vtk
@@ -32,6 +32,11 @@ from ..path import LATLON_PATH
 
 logger = logging.getLogger("vision6D")
 
+# numpy dtype matching vtkIdType, VTK cell arrays can only share buffers of this type
+VTK_ID_DTYPE = vtknp.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+# correspondences a warm started pose is refined on, see solve_pnp_warm_start
+REFINE_POINTS = 1000
+
 def fread(fid, _len, _type):
     if _len == 0:
         return np.empty(0)
@@ -110,65 +115,138 @@ def load_meshobj(meshpath):
         meshobj = meshread(fid)
     return meshobj
 
+def mmap_meshobj(meshpath):
+    """Memory-maps a binary .mesh file without copying its vertex and triangle buffers
+
+    The header is parsed with a single read, the vertices and triangles are returned as
+    read-only np.memmap views of shape (numverts, 3) and (numtris, 3). The on-disk layout
+    of a 3 x N array in Fortran order is the same as a C-contiguous N x 3 array, so both
+    views can be handed to trimesh/pyvista as they are.
+
+    Parameters
+    ----------
+    meshpath (str or pathlib.Path)
+        Path to the .mesh file
+
+    """
+    # id, numverts, numtris, n, orient(3), dim(3), sz(3), color(3) => 16 words at most
+    header = np.fromfile(meshpath, np.int32, 16)
+
+    meshobj = EasyDict()
+    meshobj.id = header[:1]
+    meshobj.numverts = header[1]
+    meshobj.numtris = header[2]
+
+    if header[3] == -1:
+        meshobj.orient = header[4:7]
+        meshobj.dim = header[7:10]
+        meshobj.sz = header[10:13].view(np.float32)
+        meshobj.color = header[13:16]
+        offset = 16 * 4
+    else:
+        # the header does not carry any orientation or spacing, so nothing to correct
+        meshobj.orient = np.array((1, 2, 3), dtype=np.int32)
+        meshobj.dim = np.ones(3, dtype=np.int32)
+        meshobj.sz = np.ones(3, dtype=np.float32)
+        meshobj.color = header[3:6]
+        offset = 6 * 4
+
+    if meshobj.numverts > 0: meshobj.vertices = np.memmap(meshpath, np.float32, mode='r', offset=offset, shape=(meshobj.numverts, 3))
+    else: meshobj.vertices = np.empty((0, 3), dtype=np.float32)
+    offset += 3 * 4 * meshobj.numverts
+    if meshobj.numtris > 0: meshobj.triangles = np.memmap(meshpath, np.int32, mode='r', offset=offset, shape=(meshobj.numtris, 3))
+    else: meshobj.triangles = np.empty((0, 3), dtype=np.int32)
+
+    return meshobj
+
+def meshobj_affine(meshobj):
+    """Returns the per-axis (scale, offset) that corrects the orientation and spacing of a meshobj
+
+    Flipped axes (orient[i] != i + 1) map v to (dim[i] - 1) - v, then every axis is scaled by sz,
+    so the corrected vertices are vertices * scale + offset.
+    """
+    flip = meshobj.orient != np.array((1, 2, 3))
+    sz = meshobj.sz.astype(np.float64)
+    scale = np.where(flip, -sz, sz)
+    offset = np.where(flip, (meshobj.dim - 1) * sz, 0)
+    return scale, offset
+
+def correct_meshobj_vertices(meshobj, dtype=np.float64):
+    """Applies the orientation and spacing correction of a meshobj in a single pass
+
+    The identity correction returns the (memory-mapped) vertices as they are, otherwise exactly
+    one output array of the requested dtype is allocated.
+    """
+    scale, offset = meshobj_affine(meshobj)
+    if (scale == 1).all() and (offset == 0).all() and meshobj.vertices.dtype == dtype: return meshobj.vertices
+    vertices = np.multiply(meshobj.vertices, scale, dtype=dtype)
+    vertices += offset
+    return vertices
+
 def load_trimesh(meshpath):
-    meshobj = load_meshobj(meshpath)
-    # load the original ossicles
-    idx = np.where(meshobj.orient != np.array((1,2,3)))
-    for i in idx: meshobj.vertices[i] = (meshobj.dim[i] - 1).reshape((-1,1)) - meshobj.vertices[i]
-    # check the results
-    # writemesh(meshpath, meshobj, mirror)
-
-    # Reflection Relative to YZ Plane (x):
-    # if mirror: 
-    #     meshobj.vertices[0] = (meshobj.dim[0] - 1) - meshobj.vertices[0].T
-    #     writemesh(meshpath, meshobj, mirror=mirror)
-        
-    meshobj.vertices = meshobj.vertices * meshobj.sz.reshape((-1, 1))
-    mesh = trimesh.Trimesh(vertices=meshobj.vertices.T, faces=meshobj.triangles.T, process=False) # mesh.vertices = meshobj.vertices.T.astype(np.float32) # mesh.faces = meshobj.triangles.T.astype(np.float32)
-    assert mesh.vertices.shape == meshobj.vertices.T.shape
-    assert mesh.faces.shape == meshobj.triangles.T.shape
+    meshobj = mmap_meshobj(meshpath)
+    # load the original ossicles, the orientation and spacing are corrected in one pass over the mapped vertices
+    vertices = correct_meshobj_vertices(meshobj)
+    mesh = trimesh.Trimesh(vertices=vertices, faces=meshobj.triangles, process=False)
+    # keep the header around so the mesh can be written back without re-reading the file
+    mesh.metadata.update({key: meshobj[key] for key in ('id', 'orient', 'dim', 'sz', 'color')})
+    assert mesh.vertices.shape == (meshobj.numverts, 3)
+    assert mesh.faces.shape == (meshobj.numtris, 3)
     return mesh
 
-def writemesh(meshpath, output_path, mesh, mirror=False, suffix=''):
+def meshobj_header(metadata=None):
+    """Returns the .mesh header fields (id, dim, sz, color) kept in a trimesh metadata dict
+
+    Meshes that were not loaded from a .mesh file fall back to a unit spacing header.
+    """
+    metadata = metadata if metadata is not None else {}
+    header = EasyDict()
+    header.id = np.asarray(metadata.get('id', (0,)), dtype=np.int32).reshape(1)
+    header.dim = np.asarray(metadata.get('dim', (1, 1, 1)), dtype=np.int32).reshape(3)
+    header.sz = np.asarray(metadata.get('sz', (1, 1, 1)), dtype=np.float32).reshape(3)
+    header.color = np.asarray(metadata.get('color', (0, 0, 0)), dtype=np.int32).reshape(3)
+    return header
+
+def mesh_file_name(stem, suffix=''):
+    """Name writemesh gives the .mesh file written for stem, without its "centered" tag"""
+    name = stem
+    if "centered" in name: name = '_'.join(name.split("_")[:-1])
+    return name + suffix
+
+def writemesh(output_path, vertices, faces, header, suffix=''):
     """
     write mesh object to improvise, and keep the original meshobj.sz
+
+    The header fields come from memory (see meshobj_header), the whole file is assembled in one
+    preallocated buffer and written with a single call. vertices are N x 3 in the (corrected)
+    source units, they are written with orient = (1, 2, 3).
     """
-    meshobj = load_meshobj(meshpath)
-    # the shape has to be 3 x N
-    meshobj.vertices = mesh.vertices.T / meshobj.sz.reshape((-1, 1)) if mesh.vertices.shape[1]==3 else mesh.vertices / meshobj.sz.reshape((-1, 1))
-    meshobj.orient = np.array((1, 2, 3), dtype="int32")
-
-    name = output_path.stem
-    if "centered" in name: 
-        name = '_'.join(name.split("_")[:-1])
-    name += suffix
-    
-    if mirror:
-        if 'left' in name: side = "right"
-        elif "right" in name: side = "left"
-        name = name.split("_")[0] + "_" + side + "_" + '_'.join(name.split("_")[2:-1])
-
-    with open(output_path.parent / (name + ".mesh"), "wb") as f:
-        f.write(meshobj.id.astype('int32'))
-        f.write(meshobj.numverts.astype('int32'))
-        f.write(meshobj.numtris.astype('int32'))
-        f.write(np.int32(-1))
-        f.write(meshobj.orient.astype('int32'))
-        f.write(meshobj.dim.astype('int32'))
-        f.write(meshobj.sz.astype('float32'))
-        f.write(meshobj.color.astype('int32'))
-        # ndarray need to be continuous!
-        f.write(np.array(meshobj.vertices).astype("float32").tobytes(order='F'))
-        f.write(meshobj.triangles.astype("int32").tobytes(order='F'))
-        """
-        # if hasattr(mesh, "opacity"):
-        #     f.write(mesh.opacity.T)
-        #     if hasattr(mesh, "colormap"):
-        #         f.write(mesh.colormap.numcols.T)
-        #         f.write(mesh.colormap.numverts.T)
-        #         f.write(mesh.colormap.cols.T)
-        #         f.write(mesh.colormap.vertexindexes.T.tobytes(order='C'))
-        """
+    output_path = pathlib.Path(output_path)
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    numverts, numtris = len(vertices), len(faces)
+
+    name = mesh_file_name(output_path.stem, suffix)
+
+    # header (16 words) + vertices (float32) + triangles (int32), a 3 x N array in fortran order is a N x 3 array in C order
+    buffer = np.empty(16 * 4 + numverts * 3 * 4 + numtris * 3 * 4, dtype=np.uint8)
+    words = buffer[:16 * 4].view(np.int32)
+    words[0] = header.id[0]
+    words[1] = numverts
+    words[2] = numtris
+    words[3] = -1
+    words[4:7] = (1, 2, 3)
+    words[7:10] = header.dim
+    words[10:13] = header.sz.astype(np.float32).view(np.int32)
+    words[13:16] = header.color
+    offset = 16 * 4
+    np.divide(vertices, header.sz, out=buffer[offset:offset + numverts * 3 * 4].view(np.float32).reshape((numverts, 3)), casting='unsafe')
+    offset += numverts * 3 * 4
+    buffer[offset:].view(np.int32).reshape((numtris, 3))[:] = faces
+
+    output_path = output_path.parent / (name + ".mesh")
+    with open(output_path, "wb") as f: f.write(buffer)
+    return output_path
         
 def color2binary_mask(color_mask):
     binary_mask = np.zeros(color_mask[...,:1].shape, dtype=np.uint8)
@@ -201,6 +279,45 @@ def create_2d_3d_pairs(color_mask:np.ndarray, vertices:pv.pyvista_ndarray, binar
     
     return vtx, pts
 
+def depth_edges(depth:np.ndarray, max_step:float=1e-3):
+    """Pixels of a depth render next to a depth discontinuity or to the background (nan), as a boolean mask
+
+    max_step is the largest depth jump to a 4-neighbor, relative to the depth, still taken as the same surface. The
+    colors of these pixels come from the edge of a surface, where a render and the surface behind it meet.
+    """
+    padded = np.pad(depth, 1, constant_values=np.nan)
+    edges = ~np.isfinite(depth)
+    with np.errstate(invalid='ignore'):
+        for neighbor in (padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]):
+            edges |= ~(np.abs(neighbor - depth) <= max_step * np.abs(depth))
+    return edges
+
+def sample_correspondences(pts2d, strategy='grid', max_points=5000, seed=0):
+    """Indices of at most max_points of the pixels pts2d (n, 2), in ascending order
+
+    grid    one random pixel per square cell, the cells are sized so about max_points of them are covered
+    random  a uniform random subset
+    stride  every k-th pixel, no randomness
+    all     every pixel
+    The same seed always picks the same pixels.
+    """
+    n = len(pts2d)
+    if strategy == 'all' or n <= max_points: return np.arange(n)
+    rng = np.random.default_rng(seed)
+    if strategy == 'random': return np.sort(rng.choice(n, max_points, replace=False))
+    if strategy == 'stride': return np.arange(0, n, int(np.ceil(n / max_points)))
+    if strategy != 'grid': raise ValueError(f"Unknown correspondence sampling {strategy}")
+    # a pixel covers a unit area, so the mask covers about n / cell_size**2 cells
+    cell_size = np.ceil(np.sqrt(n / max_points))
+    cells = np.floor((pts2d - pts2d.min(axis=0)) / cell_size).astype(np.int64)
+    cells = cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1]
+    # the first pixel of every cell in a random order is a random pixel of that cell
+    order = rng.permutation(n)
+    index = order[np.unique(cells[order], return_index=True)[1]]
+    # the partly covered cells on the border can still add up to more than max_points
+    if len(index) > max_points: index = rng.choice(index, max_points, replace=False)
+    return np.sort(index)
+
 def solve_epnp_cv2(pts2d, pts3d, camera_intrinsics):
     pts2d = pts2d.astype('float32')
     pts3d = pts3d.astype('float32')
@@ -216,6 +333,62 @@ def solve_epnp_cv2(pts2d, pts3d, camera_intrinsics):
             predicted_pose[:3, 3] = coordinate_change @ np.squeeze(translation_vector)
     return predicted_pose
 
+def solve_pnp_warm_start(pts2d, pts3d, camera_intrinsics, initial_pose, max_error=2.0, search_radius=20.0):
+    """Refines initial_pose (a neighboring frame's pose) on the correspondences, returns (pose, True if the refinement was kept)
+
+    The poses are in the vtk world like solve_epnp_cv2 returns them. Only the points initial_pose already projects within
+    search_radius pixels are refined on, so outliers do not pull the pose. When the median reprojection error of the
+    refined pose is above max_error pixels the pose is solved again from scratch with EPnP RANSAC.
+    """
+    coordinate_change = np.array([[-1, 0, 0], [0, -1, 0], [0, 0, 1]])
+    pts2d, pts3d = np.asarray(pts2d, dtype=np.float64), np.asarray(pts3d, dtype=np.float64)
+    camera_intrinsics = np.asarray(camera_intrinsics, dtype=np.float64)
+    if pts2d.shape[0] > 4 and np.all(np.isfinite(initial_pose)):
+        predicted_pose = initial_pose
+        # the search radius first, then the inlier threshold of solve_epnp_cv2's RANSAC (8 pixels) around the refined pose
+        for radius in (search_radius, 8.0):
+            inliers = np.flatnonzero(reprojection_errors(predicted_pose, pts2d, pts3d, camera_intrinsics) < radius)
+            if len(inliers) <= max(4, 0.5 * len(pts2d)): break
+            # the cost of a step grows with the points, a strided subset of the inliers is as accurate
+            inliers = inliers[::int(np.ceil(len(inliers) / REFINE_POINTS))]
+            rotation_vector = cv2.Rodrigues(coordinate_change @ predicted_pose[:3, :3])[0]
+            translation_vector = (coordinate_change @ predicted_pose[:3, 3]).reshape((3, 1))
+            # a few Levenberg-Marquardt steps from the guess instead of sampling minimal sets
+            success, rotation_vector, translation_vector = cv2.solvePnP(pts3d[inliers], pts2d[inliers], camera_intrinsics, np.zeros((4, 1)),
+                                                                        rotation_vector, translation_vector, useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+            if not success: break
+            predicted_pose = np.eye(4)
+            predicted_pose[:3, :3] = coordinate_change @ cv2.Rodrigues(rotation_vector)[0]
+            predicted_pose[:3, 3] = coordinate_change @ np.squeeze(translation_vector)
+        else:
+            if np.median(reprojection_errors(predicted_pose, pts2d, pts3d, camera_intrinsics)) <= max_error: return predicted_pose, True
+    return solve_epnp_cv2(pts2d, pts3d, camera_intrinsics), False
+
+def reprojection_errors(pose, pts2d, pts3d, camera_intrinsics):
+    """Pixel distances of the projected pts3d to pts2d, pose is in the vtk world like solve_epnp_cv2 returns it"""
+    coordinate_change = np.diag([-1, -1, 1])
+    camera_points = pts3d @ (coordinate_change @ pose[:3, :3]).T + coordinate_change @ pose[:3, 3]
+    projected = camera_points @ np.asarray(camera_intrinsics, dtype=np.float64).T
+    projected = projected[:, :2] / projected[:, 2:]
+    return np.linalg.norm(projected - pts2d, axis=1)
+
+def reprojection_error(pose, pts2d, pts3d, camera_intrinsics):
+    """RMS of the reprojection_errors"""
+    return float(np.sqrt(np.mean(reprojection_errors(pose, pts2d, pts3d, camera_intrinsics) ** 2)))
+
+def mirror_initial_pose(actor_matrix, mirror_x, mirror_y, conjugate=True):
+    """The pose the PnP solver of a mirrored mesh starts from, for a saved actor matrix
+
+    The actor matrix is mirrored the way the ground truth pose is (left multiplied). The nocs solver works in the
+    conjugated frame of that pose, its result is conjugated back, the latlon solver in the mirrored pose itself.
+    """
+    pose = actor_matrix
+    for mirror, flip in ((mirror_x, np.diag([-1, 1, 1, 1])), (mirror_y, np.diag([1, -1, 1, 1]))):
+        if mirror:
+            pose = flip @ pose
+            if conjugate: pose = flip @ pose @ flip
+    return pose
+
 def transform_vertices(vertices, transformation_matrix=np.eye(4)):
 
     ones = np.ones((vertices.shape[0], 1))
@@ -225,30 +398,69 @@ def transform_vertices(vertices, transformation_matrix=np.eye(4)):
     return transformed_vertices
 
 def normalize(x):
-    return (x - min(x)) / (max(x) - min(x))
+    return (x - np.min(x)) / (np.max(x) - np.min(x))
 
 def de_normalize(rgb, vertices):
     return rgb * (np.max(vertices) - np.min(vertices)) + np.min(vertices)
 
 def color_mesh_nocs(vertices, color=''):
+    """Returns the nocs colors of the vertices as uint8 rgb, every axis is normalized to [0, 255] on its own"""
     assert vertices.shape[1] == 3, "the vertices is suppose to be transposed"
-    colors = copy.deepcopy(vertices)
-    # normalize vertices and center it to 0
-    colors[..., 0] = normalize(vertices[..., 0])
-    colors[..., 1] = normalize(vertices[..., 1])
-    colors[..., 2] = normalize(vertices[..., 2])
+    vmin = np.min(vertices, axis=0)
+    extent = np.max(vertices, axis=0) - vmin
+    extent[extent == 0] = 1
+    # a single float32 scratch buffer, rounded to the nearest integer on the cast
+    colors = np.subtract(vertices, vmin, out=np.empty(vertices.shape, dtype=np.float32), casting='same_kind')
+    colors *= (255 / extent).astype(np.float32)
+    colors += 0.5
     # elif color == 'latlon': colors = load_latitude_longitude()
-    return colors
+    return colors.astype(np.uint8)
+
+def update_nocs_colors(colors, transformation_matrix):
+    """Updates uint8 nocs colors in place after the vertices were transformed by transformation_matrix
+
+    The nocs colors do not change under a per axis scaling and a translation, a negative scale flips the
+    axis. Returns False if the linear part mixes the axes, the colors then have to be recomputed.
+    """
+    linear = np.asarray(transformation_matrix)[:3, :3]
+    scale = np.diag(linear)
+    if not np.array_equal(linear, np.diag(scale)) or np.any(scale == 0): return False
+    for axis in np.flatnonzero(scale < 0): np.subtract(255, colors[:, axis], out=colors[:, axis])
+    return True
     
 def save_image(array, folder, name):
     img = Image.fromarray(array)
     img.save(folder / name)
 
-def mesh2ply(meshpath, output_path):
-    mesh = load_trimesh(meshpath)
-    ply_file = trimesh.exchange.ply.export_ply(mesh)
+def write_ply(output_path, vertices, faces, double=False):
+    """Writes a binary little endian PLY straight from the vertex and face buffers
+
+    The vertices are float32 like trimesh.exchange.ply.export_ply writes them (the files only lack its comment line),
+    double keeps them in float64 instead.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype="<f8" if double else "<f4")
+    scalar = "double" if double else "float"
+    # every face is stored as a packed (count, i0, i1, i2) record, the same layout as trimesh's export
+    face_records = np.empty(len(faces), dtype=np.dtype([("count", "u1"), ("index", "<i4", (3,))]))
+    face_records["count"] = 3
+    face_records["index"] = faces
+    header = ("ply\n"
+              "format binary_little_endian 1.0\n"
+              f"element vertex {len(vertices)}\n"
+              f"property {scalar} x\n"
+              f"property {scalar} y\n"
+              f"property {scalar} z\n"
+              f"element face {len(faces)}\n"
+              "property list uchar int vertex_indices\n"
+              "end_header\n").encode("ascii")
     with open(output_path, "wb") as fid:
-        fid.write(ply_file)
+        fid.write(header)
+        fid.write(vertices)
+        fid.write(face_records)
+
+def mesh2ply(meshpath, output_path, double=False):
+    mesh = load_trimesh(meshpath)
+    write_ply(output_path, mesh.vertices, mesh.faces, double)
 
 def rigid_transform_3D(A, B):
 
@@ -406,11 +618,49 @@ def get_bbox_actor_points(actor, image_center):
     points = image_center - points
     return points
 
-def get_mesh_actor_vertices_faces(actor):
-    input = actor.GetMapper().GetInput()
+def project_points(points, camera, width, height):
+    """Projects world points into pixel coordinates of a width x height render of camera
+
+    x goes right and y goes down from the top left corner of the image, pixel centers are at .5
+    """
+    matrix = pv.array_from_vtkmatrix(camera.GetCompositeProjectionTransformMatrix(width / height, -1, 1))
+    homogeneous_points = np.hstack((points, np.ones((points.shape[0], 1)))) @ matrix.T
+    ndc = homogeneous_points[:, :2] / homogeneous_points[:, 3:]
+    return np.stack(((ndc[:, 0] + 1) * (width / 2), (1 - ndc[:, 1]) * (height / 2)), axis=1)
+
+def fill_polygon_mask(polygon, width, height):
+    """Rasterizes a polygon in pixel coordinates into a binary uint8 mask, a pixel is set when its center is inside"""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    # cv2 has the pixel centers on integer coordinates, the shift keeps 4 bits of sub-pixel precision
+    polygon = np.round((polygon - 0.5) * 16).astype(np.int32)
+    cv2.fillPoly(mask, [polygon], 1, lineType=cv2.LINE_8, shift=4)
+    return mask
+
+def create_pv_mesh(vertices, faces):
+    """Creates a triangle pv.PolyData on top of the given vertices and faces buffers
+
+    The points and the cell connectivity are zero-copy VTK views of the numpy arrays, so a trimesh built
+    from the same arrays (or from get_polydata_vertices_faces) shares the geometry with the rendered mesh.
+    Only arrays with the wrong dtype (vertices float64, faces vtkIdType) are converted once.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape((-1, 3))
+    faces = np.ascontiguousarray(faces, dtype=VTK_ID_DTYPE).reshape((-1, 3))
+    points = vtk.vtkPoints()
+    points.SetData(vtknp.numpy_to_vtk(vertices, deep=False))
+    offsets = np.arange(0, faces.size + 1, 3, dtype=VTK_ID_DTYPE)
+    polys = vtk.vtkCellArray()
+    polys.SetData(vtknp.numpy_to_vtkIdTypeArray(offsets, deep=False), vtknp.numpy_to_vtkIdTypeArray(faces.reshape(-1), deep=False))
+    pv_mesh = pv.PolyData()
+    pv_mesh.SetPoints(points)
+    pv_mesh.SetPolys(polys)
+    return pv_mesh
+
+def get_polydata_vertices_faces(input):
     points = input.GetPoints().GetData()
-    cells = input.GetPolys().GetData()
+    cells = input.GetPolys()
     vertices = vtknp.vtk_to_numpy(points)
+    # triangle meshes expose their connectivity directly, no need to go through the legacy layout
+    if cells.IsHomogeneous() == 3: return vertices, vtknp.vtk_to_numpy(cells.GetConnectivityArray()).reshape((-1, 3))
     """
     # popular presentation
     Triangle 1: (0, 1, 2)
@@ -424,17 +674,39 @@ def get_mesh_actor_vertices_faces(actor):
     Face 3: (3, 6, 7, 8)
     Face 4: (3, 9, 10, 11)
     """
-    faces = vtknp.vtk_to_numpy(cells).reshape((-1, 4))
+    faces = vtknp.vtk_to_numpy(cells.GetData()).reshape((-1, 4))
     faces = faces[:, 1:] # trim the first element in each row
     return vertices, faces
 
+def get_mesh_actor_vertices_faces(actor):
+    return get_polydata_vertices_faces(actor.GetMapper().GetInput())
+
 def get_mesh_actor_scalars(actor):
-    input = actor.GetMapper().GetInput()
-    point_data = input.GetPointData()
-    scalars = point_data.GetScalars()
+    mapper = actor.GetMapper()
+    if not mapper.GetScalarVisibility(): return None
+    point_data = mapper.GetInput().GetPointData()
+    # colors picked by name on the mapper take precedence over the active scalars
+    scalars = point_data.GetArray(mapper.GetArrayName()) if mapper.GetArrayName() else None
+    if scalars is None: scalars = point_data.GetScalars()
     if scalars: scalars = vtknp.vtk_to_numpy(scalars)
     return scalars
 
+def set_mesh_actor_scalars(actor, name=None):
+    """Colors the actor directly with the rgb point array name of its input, or with its plain color if name is None"""
+    mapper = actor.GetMapper()
+    if name is None:
+        mapper.SetScalarVisibility(0)
+        return
+    mapper.SetScalarModeToUsePointFieldData()
+    mapper.SelectColorArray(name)
+    mapper.SetColorModeToDirectScalars()
+    mapper.SetScalarVisibility(1)
+
+def camera_key(camera):
+    """The camera parameters a render depends on, as a hashable tuple"""
+    return (camera.GetPosition(), camera.GetFocalPoint(), camera.GetViewUp(), camera.GetViewAngle(), camera.GetParallelProjection(),
+            camera.GetParallelScale(), camera.GetClippingRange(), camera.GetWindowCenter())
+
 def create_render(w, h):
     render = pv.Plotter(window_size=[w, h], lighting=None, off_screen=True) 
     render.set_background('black')
@@ -448,20 +720,27 @@ def angler_distance(R_a, R_b):
     angle_diff_deg = np.degrees(angle_diff_rad)
     return angle_diff_deg
 
-def reset_vtk_lut(colormap):
-    if isinstance(colormap, str):
-        color_num = 256
-        viridis_cm = plt.get_cmap(colormap, color_num)
-        colors = viridis_cm(np.arange(color_num))
-    else:
-        colors = colormap
-        color_num = len(colors)
+@functools.lru_cache(maxsize=None)
+def colormap_vtk_lut(name, color_num=256):
+    colors = plt.get_cmap(name, color_num)(np.arange(color_num))
+    return colors_vtk_lut(colors)
+
+def colors_vtk_lut(colors):
+    """Builds a vtkLookupTable from an (N, 3) or (N, 4) float array in [0, 1] with a single copy"""
+    colors = np.asarray(colors, dtype=np.float64)
+    table = np.ones((len(colors), 4))
+    table[:, :colors.shape[1]] = colors[:, :4]
+    table[:, 3] = 1.0 # opacity
     lut = vtk.vtkLookupTable()
-    lut.SetNumberOfTableValues(color_num)
-    lut.Build()
-    for i, color in enumerate(colors): lut.SetTableValue(i, color[0], color[1], color[2], 1.0)  # Last value is alpha (opacity)
+    lut.SetNumberOfTableValues(len(colors))
+    lut.SetTable(vtknp.numpy_to_vtk(np.round(table * 255).astype(np.uint8), deep=True, array_type=vtk.VTK_UNSIGNED_CHAR))
     return lut
 
+def reset_vtk_lut(colormap):
+    # lookup tables of named colormaps are built once and shared, do not modify them
+    if isinstance(colormap, str): return colormap_vtk_lut(colormap)
+    return colors_vtk_lut(colormap)
+
 def display_warning(message):
     QtWidgets.QMessageBox.warning(QtWidgets.QMainWindow(), "vision6D", message, QtWidgets.QMessageBox.Ok, QtWidgets.QMessageBox.Ok)
     return 0
\ No newline at end of file
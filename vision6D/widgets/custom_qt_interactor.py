@@ -32,6 +32,8 @@ class CustomQtInteractor(QtInteractor):
                     self.main_window.draw_menu(event)
             
     def press_callback(self, obj, *args):
+        # render the decimated proxies of large meshes while dragging
+        self.main_window.mesh_store.use_lod_meshes(True)
         x, y = obj.GetEventPosition()
         cell_picker = vtk.vtkCellPicker()
         if cell_picker.Pick(x, y, 0, self.renderer): 
@@ -41,6 +43,8 @@ class CustomQtInteractor(QtInteractor):
                 self.main_window.check_button('image')
 
     def release_callback(self):
+        # back to full resolution before anything reads the meshes from the actors
+        if self.main_window.mesh_store.use_lod_meshes(False): self.render()
         if self.cell_picker: 
             picked_actor = self.cell_picker.GetActor()
             name = picked_actor.name
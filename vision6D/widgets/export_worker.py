@@ -0,0 +1,70 @@
+'''
+@author: Yike (Nicole) Zhang
+@license: (C) Copyright.
+@contact: yike.zhang@vanderbilt.edu
+@software: Vision6D
+@file: export_worker.py
+@time: 2026-10-17 21:05
+@desc: background thread that renders and writes the exports, so the window stays responsive
+'''
+
+import os
+import queue
+import pathlib
+
+import numpy as np
+import PIL.Image
+
+from PyQt5 import QtCore, QtWidgets
+
+class ExportWorker(QtCore.QThread):
+    """Writes the submitted exports in order, off the GUI thread
+
+    A job is the array to write or a function returning it. A function must only use data snapshotted
+    on the GUI thread (no actors or plotters), vtk rendering itself stays on the GUI thread.
+    """
+    exported = QtCore.pyqtSignal(str) # message of a finished export
+    failed = QtCore.pyqtSignal(str) # error message
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = queue.Queue()
+        # the queued exports are still written when the application quits
+        app = QtWidgets.QApplication.instance()
+        if app is not None: app.aboutToQuit.connect(self.stop)
+        self.start()
+
+    def submit(self, output_path, job, message):
+        self.jobs.put((pathlib.Path(output_path), job, message))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def flush(self):
+        # blocks until every export submitted so far is written (or failed)
+        if self.isRunning(): self.jobs.join()
+
+    def stop(self):
+        if not self.isRunning(): return
+        self.jobs.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                self.jobs.task_done()
+                break
+            output_path, job, message = item
+            try:
+                array = job() if callable(job) else job
+                # write next to the target first, a half written file is never left behind
+                tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+                with open(tmp_path, "wb") as f:
+                    if output_path.suffix == '.npy': np.save(f, array)
+                    else: PIL.Image.fromarray(np.asarray(array)).save(f, format=PIL.Image.registered_extensions().get(output_path.suffix.lower(), 'PNG'))
+                os.replace(tmp_path, output_path)
+                self.exported.emit(message)
+            except Exception as e:
+                self.failed.emit(f"Failed to export {output_path}: {e}")
+            finally: self.jobs.task_done()